@@ -2,24 +2,230 @@
 
 import os
 import sys
+import json
+import time
+import asyncio
 import pandas as pd
-from fastapi import FastAPI
+from typing import Any, Dict
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import uvicorn
 
-from scripts.model_inference import load_model, load_preprocessor, data_preprocess, predict
+from scripts.model_inference import (
+    load_model, load_preprocessor, data_preprocess, predict, predict_record, predict_with_proba, get_model, get_preprocessor, model_columns, warmup,
+    warmup_prediction, cache_key, validate_record, predict_with_explanations, EXPLAIN_TOP_K
+)
+from scripts.model_registry import registry
+from scripts.result_cache import result_cache
+from scripts.batching import BatcherStopped, MicroBatcher
+from scripts.instrumentation import metrics, profile
+from scripts.batch_io import (
+    ARROW_STREAM, NDJSON, columnar_json, iter_chunks, read_table, required_columns, stream_arrow, stream_ndjson
+)
+
+# === Настройки микробатчинга ===
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "64"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "2"))
+# "batch" — микробатчинг через pandas-пайплайн, "fast" — быстрый путь без pandas для каждой записи
+PREDICT_MODE = os.getenv("PREDICT_MODE", "batch")
+
+# === Настройки /predict_batch ===
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "50000"))
+BULK_STREAM_THRESHOLD = int(os.getenv("BULK_STREAM_THRESHOLD", "100000"))
+
+# === Профилирование по запросу (GET /profile) ===
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join("logs", "profiles"))
+
+batcher = MicroBatcher(
+    predict, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS, validate_fn=validate_record
+)
+metrics.gauge("batcher_queue_depth", lambda: batcher.queue_depth, "Записей в очереди микробатчера")
+metrics.gauge("batcher_last_batch_size", lambda: batcher.last_batch_size, "Размер последнего батча микробатчера")
+metrics.gauge("result_cache_hit_rate", lambda: result_cache.stats()["hit_rate"], "Доля попаданий в кэш результатов")
+metrics.gauge("result_cache_size", lambda: result_cache.stats()["size"], "Записей в локальном кэше результатов")
+metrics.gauge("result_cache_backend_errors", lambda: result_cache.stats()["backend_errors"], "Ошибок общего бэкенда кэша")
+
+
+# === Состояние запуска: /health — жив ли процесс, /ready — прошло ли прогревочное предсказание ===
+STARTUP = {"pid": os.getpid(), "ready": False, "warmup_seconds": None}
+
+
+async def _warm_up():
+    start = time.perf_counter()
+    await run_in_threadpool(warmup_prediction)
+    STARTUP.update(ready=True, warmup_seconds=time.perf_counter() - start)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Модель и препроцессор загружаются один раз при старте, а не на каждый запрос
+    # (в scripts.serve они уже загружены мастером до fork, и здесь берутся из реестра)
+    STARTUP["pid"] = os.getpid()
+    warmup()
+    await batcher.start()
+    # Прогрев идёт в фоне: /health отвечает сразу, /ready — только после прогрева
+    warm_up_task = asyncio.create_task(_warm_up())
+    yield
+    warm_up_task.cancel()
+    await batcher.stop()
+
+
+def invalid_record(e: Exception) -> HTTPException:
+    """Ошибки во входной записи (нет колонки, нечисловое значение) — 422, а не 500."""
+    if isinstance(e, KeyError):
+        return HTTPException(status_code=422, detail=f"Missing column: {e}")
+    return HTTPException(status_code=422, detail=f"Invalid value: {e}")
+
+
+def explain_record(record: dict, top_k: int):
+    """Объяснение одной записи с той же проверкой входа, что и у /predict (KeyError / ValueError — 422)."""
+    validate_record(record)
+    return predict_with_explanations(pd.DataFrame([record]), top_k)
+
 
 # === 1. FastAPI app ===
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # === 2. Путь к тест кейсам ===
 BASE_DIR = os.path.dirname(os.path.dirname(__file__)) 
 
 # === 3. POST эндпоинт ===
 @app.post("/predict")
-def predict_fraud(data):
-    df = pd.DataFrame([data.dict()])
-    prediction = predict(df)
-    return {"prediction": int(prediction[0])}
+async def predict_fraud(request: Request, explain: bool = False, top_k: int = EXPLAIN_TOP_K):
+    """
+    Предсказание для одной записи. С ?explain=true ответ дополнительно содержит вероятность
+    и top_k вкладов SHAP, если запись выше порога мошенничества (иначе explanation = null).
+    """
+    with metrics.timer("request_predict"):
+        body = await request.body()
+        # JSON разбирается вручную, чтобы время парсинга попадало в отдельный этап
+        with metrics.timer("parse"):
+            try:
+                data: Dict[str, Any] = json.loads(body)
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=f"Invalid JSON: {e}")
+        if not isinstance(data, dict):
+            raise HTTPException(status_code=422, detail="Request body must be a JSON object")
+
+        if explain:
+            # Режим объяснений идёт мимо кэша и микробатчера: SHAP считается отдельно по этой записи
+            try:
+                preds, proba, explanations = await run_in_threadpool(explain_record, data, top_k)
+            except (KeyError, ValueError, TypeError) as e:
+                raise invalid_record(e)
+            return {"prediction": int(preds[0]), "probability": float(proba[0]), "explanation": explanations[0]}
+
+        # Повторная оценка той же записи той же моделью отдаётся из кэша без предобработки и модели
+        key = None
+        if result_cache.enabled:
+            with metrics.timer("cache_lookup"):
+                # Ключ включает версию модели из реестра: проверка файлов и возможная перезагрузка — вне event loop
+                key = await run_in_threadpool(cache_key, data)
+                prediction = await result_cache.aget(key)
+            if prediction is not None:
+                return {"prediction": prediction}
+
+        try:
+            if PREDICT_MODE == "fast":
+                # Предобработка и CatBoost — в пуле потоков, чтобы не блокировать event loop
+                prediction = await run_in_threadpool(predict_record, data)
+            else:
+                prediction = await batcher.submit(data)
+        except (KeyError, ValueError, TypeError) as e:
+            raise invalid_record(e)
+        except BatcherStopped as e:
+            raise HTTPException(status_code=503, detail=str(e))
+
+        if key is not None:
+            await result_cache.aput(key, int(prediction))
+        return {"prediction": int(prediction)}
+
+
+def read_batch(body: bytes, content_type: str) -> pd.DataFrame:
+    """Тело /predict_batch в DataFrame нужных модели колонок (модель берётся из реестра вне event loop)."""
+    return read_table(body, content_type, required_columns(get_preprocessor(), model_columns(get_model())))
+
+
+@app.post("/predict_batch")
+async def predict_fraud_batch(request: Request, explain: bool = False, top_k: int = EXPLAIN_TOP_K):
+    """
+    Пакетное предсказание.
+
+    Тело: JSON (список записей или {колонка: [значения]}), Arrow IPC или Parquet —
+    формат определяется по Content-Type. Ответ колоночный: {"prediction": [...], "probability": [...]}.
+    При Accept: application/vnd.apache.arrow.stream ответ отдаётся потоком Arrow IPC,
+    для больших батчей JSON-ответ отдаётся потоком NDJSON по чанкам.
+    С ?explain=true ответ — всегда JSON с колонкой "explanation" (top_k вкладов SHAP или null).
+    """
+    body = await request.body()
+
+    try:
+        with metrics.timer("parse_batch"):
+            df = await run_in_threadpool(read_batch, body, request.headers.get("content-type", ""))
+    except (KeyError, ValueError, TypeError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if df.empty:
+        return {"prediction": [], "probability": []}
+
+    if explain:
+        with metrics.timer("request_predict_batch"):
+            preds, proba, explanations = await run_in_threadpool(predict_with_explanations, df, top_k)
+            return {**columnar_json(preds, proba), "explanation": explanations}
+
+    results = (predict_with_proba(chunk) for chunk in iter_chunks(df, BULK_CHUNK_SIZE))
+
+    if ARROW_STREAM in request.headers.get("accept", ""):
+        return StreamingResponse(stream_arrow(results), media_type=ARROW_STREAM)
+    if len(df) > BULK_STREAM_THRESHOLD:
+        return StreamingResponse(stream_ndjson(results), media_type=NDJSON)
+
+    with metrics.timer("request_predict_batch"):
+        preds, proba = await run_in_threadpool(predict_with_proba, df)
+        return columnar_json(preds, proba)
+
+
+@app.get("/registry")
+def registry_stats():
+    return registry.stats()
+
+
+@app.get("/cache")
+def cache_stats():
+    """Статистика кэша результатов /predict: размер, попадания, промахи, hit rate."""
+    return result_cache.stats()
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", **STARTUP}
+
+
+@app.get("/ready")
+def ready():
+    if not STARTUP["ready"]:
+        return JSONResponse({"ready": False}, status_code=503)
+    return {"ready": True, "warmup_seconds": STARTUP["warmup_seconds"]}
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Гистограммы времени этапов и размеров батчей, гейджи микробатчера — в формате Prometheus."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/profile")
+def sampling_profile(seconds: float = 10.0, interval_ms: float = 5.0):
+    """
+    Сэмплирующий профиль всех потоков за seconds секунд в формате collapsed stacks
+    (flamegraph.pl / speedscope); копия сохраняется в PROFILE_DIR. Включается PROFILER_ENABLED=1.
+    """
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler is disabled (set PROFILER_ENABLED=1)")
+    return PlainTextResponse(profile(min(seconds, 60.0), interval_ms / 1000, PROFILE_DIR))
 
 # === 4. Локальная проверка ===
 if __name__ == "__main__":
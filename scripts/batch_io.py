@@ -0,0 +1,123 @@
+# scripts/batch_io.py
+
+import io
+import json
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from scripts.feature_transform import DataPreprocessor, FeatureTransformMixin
+
+# === Поддерживаемые форматы тела запроса ===
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+ARROW_FILE = "application/vnd.apache.arrow.file"
+PARQUET = "application/vnd.apache.parquet"
+NDJSON = "application/x-ndjson"
+
+
+def required_columns(feature_preprocessor: FeatureTransformMixin, columns: Optional[List[str]] = None) -> List[str]:
+    """Сырые колонки, необходимые для предобработки и модели (без дубликатов, в стабильном порядке)."""
+    columns = columns if columns is not None else DataPreprocessor.COLUMNS
+    qt_columns, ts_plan = feature_preprocessor.plan(columns)
+    derived = {f'{col}_qt' for col in qt_columns}
+    derived |= {f'{col}_{feature}' for col, features in ts_plan for feature in features}
+
+    raw = [col for col in columns if col not in derived]
+    return list(dict.fromkeys(raw + qt_columns + [col for col, _ in ts_plan]))
+
+
+def _numeric(df: pd.DataFrame) -> pd.DataFrame:
+    """Все колонки — числа (или null); нечисловое значение — ValueError с именем колонки."""
+    result = {}
+    for col in df.columns:
+        try:
+            result[col] = pd.to_numeric(df[col], errors="raise")
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"column {col!r} must be numeric: {e}") from None
+    return pd.DataFrame(result, index=df.index)
+
+
+def _select(table: pa.Table, columns: List[str]) -> pd.DataFrame:
+    missing = [col for col in columns if col not in table.column_names]
+    if missing:
+        raise KeyError(f"Missing columns: {missing}")
+    return _numeric(table.select(columns).to_pandas())
+
+
+def read_table(body: bytes, content_type: str, columns: List[str]) -> pd.DataFrame:
+    """
+    Декодирует тело запроса сразу в DataFrame с нужными колонками.
+
+    Arrow IPC и Parquet читаются колоночно, без построчных Python-словарей.
+    JSON принимается как список записей или как объект {колонка: [значения]}.
+    Нет колонки — KeyError; другая форма тела или нечисловое значение — ValueError,
+    так что ошибка входа обнаруживается до скоринга (и до начала потокового ответа).
+    """
+    content_type = (content_type or "").split(";")[0].strip().lower()
+
+    if content_type == ARROW_STREAM:
+        return _select(pa.ipc.open_stream(pa.py_buffer(body)).read_all(), columns)
+    if content_type == ARROW_FILE:
+        return _select(pa.ipc.open_file(pa.py_buffer(body)).read_all(), columns)
+    if content_type in (PARQUET, "application/octet-stream"):
+        # Parquet позволяет читать только нужные колонки
+        return _select(pq.read_table(pa.BufferReader(body), columns=columns), columns)
+
+    payload = json.loads(body)
+    if isinstance(payload, list):
+        if not payload:
+            return pd.DataFrame(columns=columns, dtype=np.float64)
+        if not all(isinstance(record, dict) for record in payload):
+            raise ValueError("JSON body must be a list of objects (records)")
+        df = pd.DataFrame.from_records(payload)
+    elif isinstance(payload, dict):
+        if not all(isinstance(values, list) for values in payload.values()):
+            raise ValueError("JSON object body must map columns to lists of values")
+        df = pd.DataFrame(payload)
+    else:
+        raise ValueError("JSON body must be a list of records or an object {column: [values]}")
+
+    missing = [col for col in columns if col not in df.columns]
+    if missing:
+        raise KeyError(f"Missing columns: {missing}")
+    return _numeric(df[columns])
+
+
+def iter_chunks(df: pd.DataFrame, chunk_size: int) -> Iterator[pd.DataFrame]:
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+
+def columnar_json(preds: np.ndarray, proba: np.ndarray) -> dict:
+    return {"prediction": preds.astype(int).tolist(), "probability": proba.tolist()}
+
+
+def _result_batch(preds: np.ndarray, proba: np.ndarray) -> pa.RecordBatch:
+    return pa.record_batch(
+        [pa.array(preds.astype(np.int8)), pa.array(proba.astype(np.float64))],
+        names=["prediction", "probability"],
+    )
+
+
+def stream_ndjson(results: Iterable) -> Iterator[bytes]:
+    """Каждый чанк результатов — одна строка NDJSON в колоночном виде."""
+    for preds, proba in results:
+        yield (json.dumps(columnar_json(preds, proba)) + "\n").encode()
+
+
+def stream_arrow(results: Iterable) -> Iterator[bytes]:
+    """Результаты в виде Arrow IPC stream, по одному record batch на чанк."""
+    schema = pa.schema([("prediction", pa.int8()), ("probability", pa.float64())])
+    sink = io.BytesIO()
+
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for preds, proba in results:
+            writer.write_batch(_result_batch(preds, proba))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+
+    yield sink.getvalue()
@@ -0,0 +1,163 @@
+# scripts/batching.py
+
+import time
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from scripts.instrumentation import BATCH_SIZE_BUCKETS, metrics
+
+
+class BatcherStopped(RuntimeError):
+    """Микробатчер остановлен, пока запись ждала в очереди или обрабатывалась."""
+
+
+class MicroBatcher:
+    """
+    Асинхронный коалесцер запросов.
+
+    Входящие записи складываются в очередь; фоновая задача собирает их в батч
+    и отправляет одним вызовом ``predict_fn`` — как только набралось
+    ``max_batch_size`` записей или прошло ``max_wait_ms`` с момента прихода первой.
+    Каждый вызывающий получает свой элемент результата. Каждая запись до сборки
+    батча проверяется ``validate_fn``: некорректная получает свою ошибку и в батч
+    не попадает, так что ответ не зависит от соседей по батчу. Если батч всё же
+    упал целиком, записи оцениваются по одной.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[pd.DataFrame], list],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 2.0,
+        validate_fn: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self.predict_fn = predict_fn
+        self.validate_fn = validate_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight: List[asyncio.Future] = []
+        self.last_batch_size = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        # Записи текущего батча и оставшиеся в очереди не останутся висеть без ответа
+        pending = list(self._inflight)
+        self._inflight = []
+        while self._queue is not None and not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            pending.append(future)
+        for future in pending:
+            if not future.done():
+                future.set_exception(BatcherStopped("Micro-batcher is shutting down"))
+
+    async def submit(self, record: Dict[str, Any]):
+        """Ставит запись в очередь и ждёт её предсказание."""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((record, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self) -> List[Tuple[Dict[str, Any], asyncio.Future, float]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            # Сначала забираем всё, что уже лежит в очереди, без ожидания
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            records = [record for record, _, _ in batch]
+            futures = [future for _, future, _ in batch]
+            self.last_batch_size = len(batch)
+
+            # Ожидание в очереди — от постановки записи до запуска её батча
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                metrics.observe_stage("queue_wait", started - enqueued)
+            metrics.observe("batch_size", len(batch), "Размер батчей микробатчера", BATCH_SIZE_BUCKETS)
+
+            self._inflight = futures
+            # Проверка, предобработка и CatBoost выполняются в пуле потоков, чтобы не блокировать event loop
+            results = await loop.run_in_executor(None, self._predict_batch, records)
+            # При отмене (stop) список остаётся заполненным — stop завершит эти futures
+            self._inflight = []
+
+            for future, result in zip(futures, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _predict_batch(self, records: List[Dict[str, Any]]) -> list:
+        """Результат или исключение для каждой записи: некорректные записи в батч не попадают."""
+        results: list = [None] * len(records)
+        valid = []
+        for i, record in enumerate(records):
+            try:
+                if self.validate_fn is not None:
+                    self.validate_fn(record)
+                valid.append(i)
+            except Exception as e:
+                results[i] = e
+        if not valid:
+            return results
+
+        batch = [records[i] for i in valid]
+        try:
+            with metrics.timer("dataframe"):
+                df = pd.DataFrame(batch)
+            predictions = self.predict_fn(df)
+        except Exception:
+            # Одна запись, прошедшая проверку, но упавшая в модели, не должна ронять весь батч
+            predictions = self._predict_each(batch)
+        for i, prediction in zip(valid, predictions):
+            results[i] = prediction
+        return results
+
+    def _predict_each(self, records: List[Dict[str, Any]]) -> list:
+        """Поштучное предсказание: для каждой записи — результат или исключение."""
+        results = []
+        for record in records:
+            try:
+                results.append(self.predict_fn(pd.DataFrame([record]))[0])
+            except Exception as e:
+                results.append(e)
+        return results
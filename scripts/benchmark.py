@@ -0,0 +1,203 @@
+# scripts/benchmark.py
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import catboost
+
+from scripts import model_inference
+from scripts.data_preprocessing import DataPreprocessor
+from scripts.model_registry import file_sha256
+from scripts.synthetic_data import synthetic_records, train_synthetic_model
+from scripts.train import available_cpus
+
+# === 1. Настройки ===
+BATCH_SIZES = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+STAGES = ("feature_transform", "data_preprocessing", "catboost_predict", "end_to_end")
+# Замедление p50 больше чем на 10% относительно baseline считается регрессией
+REGRESSION_TOLERANCE = 0.10
+
+
+# === 2. Замеры ===
+def time_call(fn, min_repeats: int = 5, min_time: float = 1.0, max_repeats: int = 1000) -> np.ndarray:
+    """
+    Время вызовов fn в секундах после одного прогревочного вызова.
+    Повторяет не меньше min_repeats раз и не меньше min_time секунд суммарно.
+    """
+    fn()
+    times = []
+    total = 0.0
+    while len(times) < max_repeats and (len(times) < min_repeats or total < min_time):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        times.append(elapsed)
+        total += elapsed
+    return np.array(times)
+
+
+def summarize(times: np.ndarray, batch_size: int) -> dict:
+    p50, p90, p99 = np.percentile(times * 1000, [50, 90, 99])
+    return {
+        "repeats": int(times.size),
+        "mean_ms": float(times.mean() * 1000),
+        "p50_ms": float(p50),
+        "p90_ms": float(p90),
+        "p99_ms": float(p99),
+        "rows_per_s": float(batch_size / np.median(times)),
+    }
+
+
+def stage_functions(batch: pd.DataFrame, model, feature_preprocessor, columns) -> dict:
+    """Замеряемые этапы для одного батча; вход модели готовится заранее и в замер не входит."""
+    data_preprocessor = DataPreprocessor(columns)
+    X = data_preprocessor.data_preprocessing(batch, feature_preprocessor)
+    return {
+        "feature_transform": lambda: feature_preprocessor.transform(batch),
+        "data_preprocessing": lambda: data_preprocessor.data_preprocessing(batch, feature_preprocessor),
+        "catboost_predict": lambda: model.predict_proba(X),
+        "end_to_end": lambda: model_inference.predict(batch),
+    }
+
+
+def environment() -> dict:
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": available_cpus(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "catboost": catboost.__version__,
+        "model_sha256": file_sha256(model_inference.MODEL_PATH),
+        "preprocessor_sha256": file_sha256(model_inference.PREPROCESSOR_PATH),
+    }
+
+
+def run_benchmark(batch_sizes=BATCH_SIZES, stages=STAGES, min_repeats: int = 5, min_time: float = 1.0,
+                  seed: int = 0) -> dict:
+    """Замеры всех этапов на синтетических батчах; модель и препроцессор — из model_inference."""
+    model = model_inference.get_model()
+    feature_preprocessor = model_inference.get_preprocessor()
+    columns = model_inference.model_columns(model)
+
+    # Данные генерируются один раз; батчи — срезы первых n строк
+    data = synthetic_records(max(batch_sizes), seed=seed)
+    results = {stage: {} for stage in stages}
+
+    for batch_size in batch_sizes:
+        batch = data.iloc[:batch_size]
+        functions = stage_functions(batch, model, feature_preprocessor, columns)
+        for stage in stages:
+            summary = summarize(time_call(functions[stage], min_repeats, min_time), batch_size)
+            results[stage][str(batch_size)] = summary
+            print(
+                f"⏱️  {stage:<20} n={batch_size:<8} p50={summary['p50_ms']:.3f} мс "
+                f"p99={summary['p99_ms']:.3f} мс  {summary['rows_per_s']:,.0f} строк/с"
+            )
+
+    return {"meta": environment(), "results": results}
+
+
+# === 3. Сравнение с baseline ===
+def compare(current: dict, baseline: dict, tolerance: float = REGRESSION_TOLERANCE) -> list:
+    """Сравнивает p50 по общим этапам и размерам батча; возвращает список регрессий."""
+    if current["meta"]["model_sha256"] != baseline["meta"]["model_sha256"]:
+        print("⚠️ Baseline снят на другой модели — сравнение p50 может быть некорректным")
+
+    regressions = []
+    for stage, by_size in current["results"].items():
+        for batch_size, summary in by_size.items():
+            reference = baseline["results"].get(stage, {}).get(batch_size)
+            if reference is None:
+                continue
+            ratio = summary["p50_ms"] / reference["p50_ms"]
+            mark = "❌" if ratio > 1 + tolerance else "✅"
+            print(f"{mark} {stage:<20} n={batch_size:<8} p50 {reference['p50_ms']:.3f} → {summary['p50_ms']:.3f} мс (x{ratio:.2f})")
+            if ratio > 1 + tolerance:
+                regressions.append({"stage": stage, "batch_size": int(batch_size), "ratio": ratio})
+    return regressions
+
+
+def save_json(data: dict, path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4)
+
+
+# === 4. Точка входа ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="🏁 Бенчмарк предобработки и инференса")
+    parser.add_argument(
+        "--batch_sizes",
+        type=int,
+        nargs="+",
+        default=list(BATCH_SIZES),
+        help="📏 Размеры батчей",
+    )
+    parser.add_argument(
+        "--stages",
+        nargs="+",
+        choices=STAGES,
+        default=list(STAGES),
+        help="🧩 Замеряемые этапы",
+    )
+    parser.add_argument("--min_repeats", type=int, default=5, help="🔁 Минимум повторов на замер")
+    parser.add_argument("--min_time", type=float, default=1.0, help="⏲️ Минимум секунд на замер")
+    parser.add_argument("--seed", type=int, default=0, help="🎲 Seed синтетических данных")
+    parser.add_argument(
+        "--output_path",
+        type=str,
+        default=os.path.join("benchmarks", "latest.json"),
+        help="💾 Куда сохранить результаты (JSON)",
+    )
+    parser.add_argument(
+        "--baseline_path",
+        type=str,
+        default=os.path.join("benchmarks", "baseline.json"),
+        help="📐 Baseline для сравнения (если файл существует)",
+    )
+    parser.add_argument("--save_baseline", action="store_true", help="📌 Сохранить результаты как новый baseline")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=REGRESSION_TOLERANCE,
+        help="🎚️ Допустимое замедление p50 (доля)",
+    )
+    parser.add_argument("--model_path", type=str, default=None, help="💾 Модель (по умолчанию MODEL_PATH)")
+    parser.add_argument("--preprocessor_path", type=str, default=None, help="💾 Препроцессор (по умолчанию PREPROCESSOR_PATH)")
+    parser.add_argument(
+        "--synthetic_model",
+        action="store_true",
+        help="🤖 Обучить небольшую модель на синтетике (если нет боевых артефактов)",
+    )
+    args = parser.parse_args()
+
+    if args.synthetic_model:
+        model_dir = tempfile.mkdtemp(prefix="benchmark_model_")
+        args.model_path, args.preprocessor_path = train_synthetic_model(model_dir)
+    model_inference.MODEL_PATH = args.model_path or model_inference.MODEL_PATH
+    model_inference.PREPROCESSOR_PATH = args.preprocessor_path or model_inference.PREPROCESSOR_PATH
+
+    report = run_benchmark(args.batch_sizes, args.stages, args.min_repeats, args.min_time, args.seed)
+    save_json(report, args.output_path)
+    print(f"✅ Результаты сохранены в {args.output_path}")
+
+    if args.save_baseline:
+        save_json(report, args.baseline_path)
+        print(f"📌 Baseline обновлён: {args.baseline_path}")
+    elif os.path.exists(args.baseline_path):
+        with open(args.baseline_path, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"❌ Регрессий: {len(regressions)}")
+            sys.exit(1)
+        print("✅ Регрессий нет")
@@ -0,0 +1,180 @@
+# scripts/compact_preprocessor.py
+
+import os
+import mmap
+import json
+import struct
+import argparse
+from typing import Dict, Optional
+
+import numpy as np
+
+from scripts.feature_transform import FeatureTransformMixin
+from scripts.model_registry import file_sha256
+from scripts.quantile_table import QuantileTable
+
+# === Формат файла ===
+# [8 байт MAGIC][uint32 версия][uint32 длина заголовка][JSON-заголовок][выравнивание][массивы]
+# Секция данных и каждый массив выровнены на ALIGNMENT и читаются через memory map без копирования.
+MAGIC = b"FRDPREP\0"
+FORMAT_VERSION = 1
+COMPACT_SUFFIX = ".fpb"
+ALIGNMENT = 64
+_PREFIX = struct.Struct("<8sII")
+
+
+def compact_path(preprocessor_path: str) -> str:
+    """models/feature_preprocessor.pkl -> models/feature_preprocessor.fpb."""
+    return os.path.splitext(preprocessor_path)[0] + COMPACT_SUFFIX
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def save_compact(feature_preprocessor, path: str, source_path: Optional[str] = None):
+    """
+    Сохраняет обученное состояние препроцессора: конфигурацию timestamp-признаков, порядок
+    колонок и таблицу квантилей. Запись атомарная (временный файл + os.replace).
+    С source_path в заголовок пишется SHA-256 pickle, из которого сделан файл (см. resolve_preprocessor_path).
+    """
+    table = feature_preprocessor.quantile_table
+    arrays = {"quantiles": table.quantiles, "references": table.references}
+
+    header = {
+        "timestamp_columns": list(feature_preprocessor.timestamp_columns),
+        "timestamp_features": {
+            col: sorted(features) for col, features in feature_preprocessor.timestamp_features.items()
+        },
+        "numeric_columns": list(feature_preprocessor.numeric_columns_),
+        "quantile_columns": list(table.columns),
+        "output_distribution": table.output_distribution,
+        "fingerprint": feature_preprocessor.fingerprint(),
+        "source_sha256": file_sha256(source_path) if source_path else None,
+        "arrays": {},
+    }
+
+    # Смещения массивов — от начала секции данных, которая идёт сразу за заголовком (с выравниванием)
+    offset = 0
+    for name, array in arrays.items():
+        header["arrays"][name] = {"shape": list(array.shape), "dtype": "<f8", "offset": offset}
+        offset = _aligned(offset + array.nbytes)
+
+    header_bytes = json.dumps(header).encode()
+    data_start = _aligned(_PREFIX.size + len(header_bytes))
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(data_start + header["arrays"][name]["offset"])
+            f.write(np.ascontiguousarray(array, dtype="<f8").tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_header(path: str) -> Dict:
+    """JSON-заголовок компактного файла (без чтения массивов); в ``format_version`` — версия формата."""
+    with open(path, "rb") as f:
+        magic, version, header_size = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compact preprocessor file")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"{path} has format version {version}, this loader supports up to {FORMAT_VERSION}")
+        header = json.loads(f.read(header_size))
+    header["format_version"] = version
+    return header
+
+
+def resolve_preprocessor_path(preprocessor_path: str) -> str:
+    """
+    Какой файл препроцессора грузить для pickle preprocessor_path: компактный .fpb рядом с ним,
+    только если он сделан из этого же pickle (SHA-256 в заголовке) или, для файлов без SHA, новее pickle.
+    Иначе (.fpb нет, устарел или повреждён) — сам pickle.
+    """
+    fpb_path = compact_path(preprocessor_path)
+    if not os.path.exists(fpb_path):
+        return preprocessor_path
+    if not os.path.exists(preprocessor_path):
+        return fpb_path
+
+    try:
+        source_sha256 = read_header(fpb_path).get("source_sha256")
+    except (ValueError, struct.error):
+        print(f"⚠️ {fpb_path} не читается — используется {preprocessor_path}")
+        return preprocessor_path
+
+    if source_sha256 is not None:
+        fresh = source_sha256 == file_sha256(preprocessor_path)
+    else:
+        fresh = os.stat(fpb_path).st_mtime_ns >= os.stat(preprocessor_path).st_mtime_ns
+    if not fresh:
+        print(f"⚠️ {fpb_path} сделан не из текущего {preprocessor_path} — используется pickle")
+        return preprocessor_path
+    return fpb_path
+
+
+class CompactPreprocessor(FeatureTransformMixin):
+    """
+    Препроцессор для инференса, загруженный из компактного файла.
+
+    Тот же ``plan``/``transform``/``fingerprint``, что и у FeaturePreprocessor, но без sklearn
+    и cloudpickle: таблица квантилей отображается в память прямо из файла.
+    """
+
+    def __init__(self, header: Dict, quantile_table: QuantileTable):
+        self.format_version = header.get("format_version", FORMAT_VERSION)
+        self.timestamp_columns = list(header["timestamp_columns"])
+        self.timestamp_features = {col: set(features) for col, features in header["timestamp_features"].items()}
+        self.numeric_columns_ = list(header["numeric_columns"])
+        self.quantile_table = quantile_table
+
+    @classmethod
+    def load(cls, path: str) -> "CompactPreprocessor":
+        header = read_header(path)
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        _, _, header_size = _PREFIX.unpack_from(buffer, 0)
+        data_start = _aligned(_PREFIX.size + header_size)
+        arrays = {}
+        for name, info in header["arrays"].items():
+            count = int(np.prod(info["shape"]))
+            if count == 0:
+                arrays[name] = np.empty(info["shape"], dtype=info["dtype"])
+                continue
+            arrays[name] = np.frombuffer(
+                buffer, dtype=info["dtype"], count=count, offset=data_start + info["offset"]
+            ).reshape(info["shape"])
+
+        table = QuantileTable(
+            header["quantile_columns"], arrays["quantiles"], arrays["references"], header["output_distribution"]
+        )
+        preprocessor = cls(header, table)
+        if preprocessor.fingerprint() != header["fingerprint"]:
+            raise ValueError(f"{path} is corrupted: fingerprint mismatch")
+        return preprocessor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="📦 Экспорт препроцессора в компактный формат (.fpb)")
+    parser.add_argument(
+        "--input_path",
+        type=str,
+        default=os.path.join("models", "feature_preprocessor.pkl"),
+        help="📂 Препроцессор в формате cloudpickle",
+    )
+    parser.add_argument(
+        "--output_path",
+        type=str,
+        default=None,
+        help="💾 Куда сохранить (по умолчанию рядом, с расширением .fpb)",
+    )
+    args = parser.parse_args()
+
+    # Для чтения pickle нужен sklearn — импортируем только в конвертере
+    from scripts.data_preprocessing import FeaturePreprocessor
+
+    output_path = args.output_path or compact_path(args.input_path)
+    save_compact(FeaturePreprocessor.load(args.input_path), output_path, source_path=args.input_path)
+    print(f"✅ Компактный препроцессор сохранён в {output_path} ({os.path.getsize(output_path)} байт)")
@@ -0,0 +1,341 @@
+# scripts/compress.py
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from catboost import CatBoostClassifier, Pool
+from sklearn.model_selection import train_test_split
+
+from scripts.benchmark import save_json, summarize, time_call
+from scripts.compact_preprocessor import COMPACT_SUFFIX, compact_path, save_compact
+from scripts.curves import BinaryCurve, classification_metrics, confusion_counts
+from scripts.dataset_io import read_dataset
+from scripts.feature_transform import DataPreprocessor
+from scripts.model_inference import load_model, load_preprocessor, model_columns
+from scripts.model_registry import save_atomic
+from scripts.thresholds import apply_threshold, load_threshold, save_threshold
+from scripts.train import model_params
+
+# === 1. Настройки ===
+SHRINK_FRACTIONS = (0.25, 0.5, 0.75)
+REFIT_DEPTHS = (4, 6, 8)
+DISTILL_DEPTHS = (6,)
+# Допустимая просадка относительно models/metrics.json (абсолютная)
+F1_TOLERANCE = 0.01
+ROC_AUC_TOLERANCE = 0.005
+# Доля train для ранней остановки переобучения и дистилляции: test используется только для отбора
+VALIDATION_FRACTION = 0.1
+LATENCY_BATCH_SIZE = 1000
+EXPORT_FORMATS = ("json", "cpp", "python", "onnx", "coreml")
+
+
+# === 2. Кандидаты ===
+def shrink_candidates(model: CatBoostClassifier, fractions=SHRINK_FRACTIONS) -> Iterator[Tuple[str, dict, CatBoostClassifier]]:
+    """Первые деревья исходной модели (CatBoost shrink) — без переобучения."""
+    for fraction in fractions:
+        ntree_end = max(1, int(model.tree_count_ * fraction))
+        candidate = model.copy()
+        candidate.shrink(ntree_end)
+        yield f"shrink_{ntree_end}", {"kind": "shrink", "ntree_end": ntree_end}, candidate
+
+
+def refit_candidate(X_train, y_train, X_val, y_val, depth: int, iterations: Optional[int] = None) -> CatBoostClassifier:
+    """Та же модель, обученная заново на CPU с меньшей глубиной (ранняя остановка по X_val)."""
+    overrides = {"depth": depth}
+    if iterations:
+        overrides["iterations"] = iterations
+    model = CatBoostClassifier(**model_params("cpu", **overrides))
+    model.fit(Pool(X_train, y_train), eval_set=Pool(X_val, y_val), use_best_model=True)
+    return model
+
+
+def distill_candidate(teacher: CatBoostClassifier, X_train, X_val, depth: int,
+                      iterations: Optional[int] = None) -> CatBoostClassifier:
+    """
+    Дистилляция: ученик меньшей глубины обучается на вероятностях исходной модели
+    (CrossEntropy с мягкими метками) и повторяет её ранжирование, а не шум в разметке.
+    Ранняя остановка — по мягким меткам X_val.
+    """
+    soft_train = teacher.predict_proba(X_train)[:, 1]
+    soft_val = teacher.predict_proba(X_val)[:, 1]
+    overrides = {"depth": depth, "loss_function": "CrossEntropy", "eval_metric": "CrossEntropy"}
+    if iterations:
+        overrides["iterations"] = iterations
+    model = CatBoostClassifier(**model_params("cpu", **overrides))
+    model.fit(Pool(X_train, soft_train), eval_set=Pool(X_val, soft_val), use_best_model=True)
+    return model
+
+
+# === 3. Качество и стоимость ===
+def score_model(model: CatBoostClassifier, X_test: pd.DataFrame, y_test, threshold: float) -> dict:
+    """Метрики в схеме metrics.json при сохранённом пороге решения (как в сервисе и scripts.predict)."""
+    proba = model.predict_proba(X_test)[:, 1]
+    y_pred = apply_threshold(proba, threshold)
+    y_true = np.asarray(y_test).astype(int)
+    curve = BinaryCurve.from_scores(y_true, proba)
+    return classification_metrics(confusion_counts(y_true, y_pred), curve.roc_auc_or_none())
+
+
+def measure_cost(model: CatBoostClassifier, X_test: pd.DataFrame, min_time: float = 0.5) -> dict:
+    """Размер .cbm, время загрузки и задержка предсказания одной строки и батча."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "model.cbm")
+        model.save_model(path)
+        size_bytes = os.path.getsize(path)
+        start = time.perf_counter()
+        load_model(path)
+        load_ms = (time.perf_counter() - start) * 1000
+
+    single = X_test.iloc[:1]
+    batch = X_test.iloc[:LATENCY_BATCH_SIZE]
+    return {
+        "size_bytes": size_bytes,
+        "load_ms": load_ms,
+        "tree_count": model.tree_count_,
+        "depth": model.get_all_params().get("depth"),
+        "single_row": summarize(time_call(lambda: model.predict_proba(single), min_time=min_time), 1),
+        "batch": summarize(time_call(lambda: model.predict_proba(batch), min_time=min_time), len(batch)),
+    }
+
+
+def within_tolerance(metrics: dict, reference: dict, f1_tolerance: float, roc_auc_tolerance: float) -> bool:
+    """
+    F1 и ROC-AUC не ниже опорных минус допуск. Если опорный ROC-AUC не определён (null —
+    в test один класс), критерий по AUC не применяется; если не определён только у кандидата —
+    кандидат отклоняется.
+    """
+    if metrics["f1_score"] < reference["f1_score"] - f1_tolerance:
+        return False
+    if reference.get("roc_auc") is None:
+        return True
+    return metrics["roc_auc"] is not None and metrics["roc_auc"] >= reference["roc_auc"] - roc_auc_tolerance
+
+
+def _format_auc(value: Optional[float]) -> str:
+    return "n/a" if value is None else f"{value:.4f}"
+
+
+# === 4. Отбор и экспорт ===
+def compress(model_path: str, preprocessor_path: str, train_path: str, test_path: str, metrics_path: str,
+             output_dir: str, f1_tolerance: float = F1_TOLERANCE, roc_auc_tolerance: float = ROC_AUC_TOLERANCE,
+             shrink_fractions=SHRINK_FRACTIONS, refit_depths=REFIT_DEPTHS, distill_depths=DISTILL_DEPTHS,
+             iterations: Optional[int] = None, export_formats=(), min_time: float = 0.5) -> dict:
+    """
+    Строит уменьшенные варианты модели (shrink, переобучение с меньшей глубиной, дистилляция),
+    выбирает самый быстрый (p50 батча) среди укладывающихся в допуск по F1 и ROC-AUC
+    относительно metrics.json и сохраняет его в output_dir вместе с отчётом compression_report.json.
+
+    Переобучение и дистилляция останавливаются по валидационной части train (VALIDATION_FRACTION),
+    test используется только для отбора. Все кандидаты оцениваются при пороге исходной модели,
+    который сохраняется и рядом с выбранной.
+    """
+    # 1. Исходная модель и признаки train/test тем же препроцессором
+    teacher = load_model(model_path)
+    threshold = load_threshold(model_path)
+    feature_preprocessor = load_preprocessor(preprocessor_path)
+    data_preprocessor = DataPreprocessor(model_columns(teacher))
+
+    test = read_dataset(test_path)
+    X_test = data_preprocessor.data_preprocessing(test.drop(columns=["target"]), feature_preprocessor)
+    y_test = test["target"]
+    if refit_depths or distill_depths:
+        train = read_dataset(train_path)
+        X_train = data_preprocessor.data_preprocessing(train.drop(columns=["target"]), feature_preprocessor)
+        y_train = train["target"]
+        X_train, X_val, y_train, y_val = train_test_split(
+            X_train, y_train, test_size=VALIDATION_FRACTION, random_state=42, stratify=y_train
+        )
+
+    # 2. Опорные метрики: metrics.json, а если его нет — исходная модель на test
+    original_metrics = score_model(teacher, X_test, y_test, threshold)
+    if os.path.exists(metrics_path):
+        with open(metrics_path, "r", encoding="utf-8") as f:
+            reference = json.load(f)
+        reference_source = metrics_path
+    else:
+        reference, reference_source = original_metrics, "original"
+    if reference.get("roc_auc") is None:
+        print("⚠️ Опорный ROC-AUC не определён (в test один класс) — кандидаты сравниваются только по F1")
+
+    # 3. Кандидаты
+    def candidates():
+        yield "original", {"kind": "original"}, teacher
+        yield from shrink_candidates(teacher, shrink_fractions)
+        for depth in refit_depths:
+            yield f"refit_depth{depth}", {"kind": "refit", "depth": depth}, refit_candidate(
+                X_train, y_train, X_val, y_val, depth, iterations
+            )
+        for depth in distill_depths:
+            yield f"distill_depth{depth}", {"kind": "distill", "depth": depth}, distill_candidate(
+                teacher, X_train, X_val, depth, iterations
+            )
+
+    results, models = [], {}
+    for name, info, model in candidates():
+        metrics = original_metrics if name == "original" else score_model(model, X_test, y_test, threshold)
+        cost = measure_cost(model, X_test, min_time)
+        eligible = within_tolerance(metrics, reference, f1_tolerance, roc_auc_tolerance)
+        results.append({"name": name, **info, "metrics": metrics, "cost": cost, "within_tolerance": eligible})
+        models[name] = model
+        print(
+            f"{'✅' if eligible else '❌'} {name:<16} деревьев={cost['tree_count']:<5} "
+            f"F1={metrics['f1_score']:.4f} ROC-AUC={_format_auc(metrics['roc_auc'])} "
+            f"размер={cost['size_bytes'] / 1024:.0f} КБ p50(батч)={cost['batch']['p50_ms']:.2f} мс"
+        )
+
+    # 4. Самый дешёвый кандидат в допуске; если таких нет — исходная модель
+    eligible = [r for r in results if r["within_tolerance"]]
+    if not eligible:
+        print("⚠️ Ни один кандидат не укладывается в допуск — остаётся исходная модель")
+        eligible = [results[0]]
+    chosen = min(eligible, key=lambda r: (r["cost"]["batch"]["p50_ms"], r["cost"]["size_bytes"]))
+
+    # 5. Экспорт выбранной модели
+    os.makedirs(output_dir, exist_ok=True)
+    chosen_model = models[chosen["name"]]
+    chosen_path = os.path.join(output_dir, os.path.basename(model_path))
+    save_atomic(chosen_path, chosen_model.save_model)
+    save_threshold(chosen_path, threshold)
+    exported = {"cbm": chosen_path}
+    # Быстрая загрузка для сервиса: .cbm — собственный бинарный формат CatBoost, а препроцессор
+    # кладётся рядом в компактном формате (.fpb, memory map без sklearn и cloudpickle)
+    compact_preprocessor_path = os.path.join(output_dir, os.path.basename(compact_path(preprocessor_path)))
+    if preprocessor_path.endswith(COMPACT_SUFFIX):
+        shutil.copyfile(preprocessor_path, compact_preprocessor_path)
+    else:
+        save_compact(feature_preprocessor, compact_preprocessor_path, source_path=preprocessor_path)
+    exported["preprocessor"] = compact_preprocessor_path
+    for fmt in export_formats:
+        path = os.path.splitext(chosen_path)[0] + {"python": ".py", "coreml": ".mlmodel"}.get(fmt, f".{fmt}")
+        try:
+            chosen_model.save_model(path, format=fmt)
+            exported[fmt] = path
+        except Exception as e:
+            print(f"⚠️ Экспорт в {fmt} не удался: {e}")
+
+    original = results[0]["cost"]
+    report = {
+        "source_model": model_path,
+        "reference": {"source": reference_source, "metrics": reference},
+        "tolerance": {"f1_score": f1_tolerance, "roc_auc": roc_auc_tolerance},
+        "threshold": threshold,
+        "validation_fraction": VALIDATION_FRACTION,
+        "chosen": chosen["name"],
+        "exported": exported,
+        "reduction": {
+            "size": original["size_bytes"] / chosen["cost"]["size_bytes"],
+            "batch_latency": original["batch"]["p50_ms"] / chosen["cost"]["batch"]["p50_ms"],
+            "single_row_latency": original["single_row"]["p50_ms"] / chosen["cost"]["single_row"]["p50_ms"],
+        },
+        "candidates": results,
+    }
+    save_json(report, os.path.join(output_dir, "compression_report.json"))
+    print(
+        f"🏆 Выбрана {chosen['name']}: размер меньше в {report['reduction']['size']:.1f} раз, "
+        f"батч быстрее в {report['reduction']['batch_latency']:.1f} раз ➜ {chosen_path}"
+    )
+    return report
+
+
+# === 5. Точка входа ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="🗜️ Сжатие модели: shrink, меньшая глубина, дистилляция")
+    parser.add_argument(
+        "--model_path",
+        type=str,
+        default=os.path.join("models", "catboost_model.cbm"),
+        help="📂 Исходная модель",
+    )
+    parser.add_argument(
+        "--preprocessor_path",
+        type=str,
+        default=os.path.join("models", "feature_preprocessor.pkl"),
+        help="📂 Препроцессор модели (.pkl или .fpb)",
+    )
+    parser.add_argument(
+        "--train_path",
+        type=str,
+        default=os.path.join("Data", "processed", "train.feather"),
+        help="📂 Обучающие данные для переобучения и дистилляции",
+    )
+    parser.add_argument(
+        "--test_path",
+        type=str,
+        default=os.path.join("Data", "processed", "test.feather"),
+        help="📂 Тестовые данные для оценки кандидатов",
+    )
+    parser.add_argument(
+        "--metrics_path",
+        type=str,
+        default=os.path.join("models", "metrics.json"),
+        help="📊 Опорные метрики (если файла нет — метрики исходной модели на test)",
+    )
+    parser.add_argument(
+        "--output_dir",
+        type=str,
+        default=os.path.join("models", "compressed"),
+        help="💾 Куда сохранить выбранную модель и compression_report.json",
+    )
+    parser.add_argument("--f1_tolerance", type=float, default=F1_TOLERANCE, help="📐 Допустимая просадка F1")
+    parser.add_argument("--roc_auc_tolerance", type=float, default=ROC_AUC_TOLERANCE, help="📐 Допустимая просадка ROC-AUC")
+    parser.add_argument(
+        "--shrink_fractions",
+        type=float,
+        nargs="*",
+        default=list(SHRINK_FRACTIONS),
+        help="✂️ Доли деревьев исходной модели для shrink",
+    )
+    parser.add_argument(
+        "--refit_depths",
+        type=int,
+        nargs="*",
+        default=list(REFIT_DEPTHS),
+        help="🌲 Глубины для переобучения",
+    )
+    parser.add_argument(
+        "--distill_depths",
+        type=int,
+        nargs="*",
+        default=list(DISTILL_DEPTHS),
+        help="🎓 Глубины учеников для дистилляции",
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=None,
+        help="🔁 Итераций для переобучения и дистилляции (по умолчанию — профиль cpu из train.py)",
+    )
+    parser.add_argument(
+        "--export_formats",
+        type=str,
+        nargs="*",
+        choices=EXPORT_FORMATS,
+        default=[],
+        help="📦 Дополнительные форматы экспорта выбранной модели",
+    )
+    parser.add_argument("--min_time", type=float, default=0.5, help="⏲️ Минимальное время замера задержки, с")
+    args = parser.parse_args()
+
+    compress(
+        args.model_path,
+        args.preprocessor_path,
+        args.train_path,
+        args.test_path,
+        args.metrics_path,
+        args.output_dir,
+        f1_tolerance=args.f1_tolerance,
+        roc_auc_tolerance=args.roc_auc_tolerance,
+        shrink_fractions=args.shrink_fractions,
+        refit_depths=args.refit_depths,
+        distill_depths=args.distill_depths,
+        iterations=args.iterations,
+        export_formats=args.export_formats,
+        min_time=args.min_time,
+    )
@@ -0,0 +1,138 @@
+# scripts/curves.py
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+class BinaryCurve:
+    """
+    Кумулятивные TP/FP бинарного классификатора по убыванию порога.
+
+    ``tps[i]`` и ``fps[i]`` — число положительных и отрицательных объектов со скором
+    ``>= thresholds[i]``. Из одного такого прохода получаются ROC, PR, AUC и метрики
+    при любом пороге — без повторной сортировки скоров.
+    """
+
+    def __init__(self, thresholds: np.ndarray, tps: np.ndarray, fps: np.ndarray):
+        self.thresholds = np.asarray(thresholds, dtype=np.float64)
+        self.tps = np.asarray(tps, dtype=np.int64)
+        self.fps = np.asarray(fps, dtype=np.int64)
+
+    @classmethod
+    def from_scores(cls, y_true: np.ndarray, y_score: np.ndarray) -> "BinaryCurve":
+        """Одна сортировка скоров; одинаковые скоры сворачиваются в одну точку, как в sklearn."""
+        y_true = np.asarray(y_true) == 1
+        y_score = np.asarray(y_score, dtype=np.float64)
+
+        order = np.argsort(y_score)[::-1]
+        y_score = y_score[order]
+        y_true = y_true[order]
+
+        # Последний индекс каждой группы одинаковых скоров
+        distinct = np.flatnonzero(np.diff(y_score))
+        ends = np.r_[distinct, y_true.size - 1]
+
+        tps = np.cumsum(y_true, dtype=np.int64)[ends]
+        fps = ends + 1 - tps
+        return cls(y_score[ends], tps, fps)
+
+    @classmethod
+    def from_histogram(cls, pos_counts: np.ndarray, neg_counts: np.ndarray, edges: np.ndarray) -> "BinaryCurve":
+        """Приближённая кривая по гистограммам скоров классов: порогами служат левые границы непустых бинов."""
+        pos_counts = np.asarray(pos_counts)[::-1]
+        neg_counts = np.asarray(neg_counts)[::-1]
+        lower = np.asarray(edges)[:-1][::-1]
+
+        filled = (pos_counts + neg_counts) > 0
+        return cls(lower[filled], np.cumsum(pos_counts)[filled], np.cumsum(neg_counts)[filled])
+
+    @property
+    def n_pos(self) -> int:
+        return int(self.tps[-1]) if self.tps.size else 0
+
+    @property
+    def n_neg(self) -> int:
+        return int(self.fps[-1]) if self.fps.size else 0
+
+    def roc(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(fpr, tpr), начиная с точки (0, 0)."""
+        tpr = np.r_[0.0, self.tps] / self.n_pos if self.n_pos else np.full(self.tps.size + 1, np.nan)
+        fpr = np.r_[0.0, self.fps] / self.n_neg if self.n_neg else np.full(self.fps.size + 1, np.nan)
+        return fpr, tpr
+
+    def roc_auc(self) -> float:
+        if not self.n_pos or not self.n_neg:
+            raise ValueError("ROC AUC is undefined when only one class is present in y_true")
+        fpr, tpr = self.roc()
+        # Трапеции: совпадает с sklearn.roc_auc_score
+        return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1])) / 2)
+
+    def roc_auc_or_none(self) -> Optional[float]:
+        """ROC-AUC или None, если в y_true только один класс."""
+        return self.roc_auc() if self.n_pos and self.n_neg else None
+
+    def pr(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(precision, recall) в порядке sklearn.precision_recall_curve: recall убывает до 0."""
+        precision = self.tps / (self.tps + self.fps)
+        recall = self.tps / self.n_pos if self.n_pos else np.full(self.tps.size, np.nan)
+        return np.r_[precision[::-1], 1.0], np.r_[recall[::-1], 0.0]
+
+    def pr_auc(self) -> float:
+        """Average precision: сумма precision по приращениям recall."""
+        precision, recall = self.pr()
+        return float(-np.sum(np.diff(recall) * precision[:-1]))
+
+    def sweep(self, thresholds: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """Confusion-счётчики, precision, recall и F1 на сетке порогов (по умолчанию 0.00, 0.01, ..., 1.00)."""
+        thresholds = np.linspace(0, 1, 101) if thresholds is None else np.asarray(thresholds, dtype=np.float64)
+        k = np.searchsorted(-self.thresholds, -thresholds, side="left")
+        tps = np.where(k > 0, self.tps[np.maximum(k - 1, 0)], 0)
+        fps = np.where(k > 0, self.fps[np.maximum(k - 1, 0)], 0)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            precision = np.nan_to_num(tps / (tps + fps))
+            recall = np.nan_to_num(tps / self.n_pos)
+            f1 = np.nan_to_num(2 * precision * recall / (precision + recall))
+
+        return {
+            "threshold": thresholds,
+            "tp": tps,
+            "fp": fps,
+            "fn": self.n_pos - tps,
+            "tn": self.n_neg - fps,
+            "precision": precision,
+            "recall": recall,
+            "f1": f1,
+        }
+
+
+def confusion_counts(y_true, y_pred) -> np.ndarray:
+    """Матрица ошибок 2x2 ([[TN, FP], [FN, TP]]) одним bincount, без сортировки."""
+    codes = 2 * (np.asarray(y_true) == 1) + (np.asarray(y_pred) == 1)
+    return np.bincount(codes, minlength=4).reshape(2, 2)
+
+
+def classification_metrics(cm: np.ndarray, roc_auc: Optional[float]) -> dict:
+    """
+    Метрики в схеме metrics.json; при делении на ноль — 0, как в sklearn по умолчанию.
+    Неопределённый ROC-AUC (один класс в y_true) записывается как null.
+    """
+    (tn, fp), (fn, tp) = cm.astype(np.float64)
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return {
+        "accuracy": float((tp + tn) / cm.sum()),
+        "precision": float(precision),
+        "recall": float(recall),
+        "f1_score": float(2 * tp / (2 * tp + fp + fn)) if tp else 0.0,
+        "roc_auc": float(roc_auc) if roc_auc is not None else None,
+    }
+
+
+def downsample(x: np.ndarray, y: np.ndarray, max_points: int = 10_000) -> Tuple[np.ndarray, np.ndarray]:
+    """Прореживает кривую для отрисовки (концы сохраняются); на миллионах точек картинка та же."""
+    if x.size <= max_points:
+        return x, y
+    idx = np.unique(np.linspace(0, x.size - 1, max_points).astype(np.int64))
+    return x[idx], y[idx]
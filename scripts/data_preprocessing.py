@@ -1,15 +1,19 @@
 # scripts/data_preprocessing.py
 
-import os
-import json
 import cloudpickle
 import numpy as np
 import pandas as pd
+# FeaturePreprocessor — sklearn-трансформер, поэтому модуль (и загрузка .pkl) всегда импортирует sklearn;
+# без sklearn работает только компактный препроцессор (scripts.compact_preprocessor)
 from sklearn.base import BaseEstimator, TransformerMixin
-from sklearn.preprocessing import QuantileTransformer
 
+# DataPreprocessor и построение признаков живут в модуле без sklearn; реэкспорт для совместимости
+from scripts.feature_transform import DataPreprocessor, FeatureTransformMixin
+from scripts.model_registry import save_atomic
+from scripts.quantile_table import QuantileTable
 
-class FeaturePreprocessor(BaseEstimator, TransformerMixin):
+
+class FeaturePreprocessor(FeatureTransformMixin, BaseEstimator, TransformerMixin):
     AVAILABLE_TS_FEATURES = {
         'borrow_timestamp': {'day', 'dayofyear', 'week'},
         'first_tx_timestamp': {'day', 'dayofweek', 'dayofyear', 'hour', 'hour_cos', 'hour_sin', 'minute', 'second', 'week'},
@@ -42,133 +46,66 @@ class FeaturePreprocessor(BaseEstimator, TransformerMixin):
         self.quantile_transformers = {}
 
     def fit(self, X: pd.DataFrame, y=None):
-        X = X.copy()
-
         if self.numeric_columns is None:
             self.numeric_columns_ = X.select_dtypes(include=[np.number]).columns.difference(self.timestamp_columns).tolist()
         else:
             self.numeric_columns_ = [col for col in self.numeric_columns if col not in self.timestamp_columns]
 
-        for col in self.numeric_columns_:
+        self._fit_quantiles(X, self.numeric_columns_)
+        return self
+
+    def _fit_quantiles(self, X: pd.DataFrame, columns, references=None):
+        # Импорт только при обучении; распаковка сохранённого .pkl всё равно импортирует QuantileTransformer
+        from sklearn.preprocessing import QuantileTransformer
+
+        # Все колонки делят одну сетку references (QuantileTable); при переобучении — сетку текущей таблицы
+        n_quantiles = self.quantile_n_quantiles if references is None else len(references)
+        for col in columns:
             qt = QuantileTransformer(
                 output_distribution=self.quantile_output_distribution,
-                n_quantiles=min(self.quantile_n_quantiles, X.shape[0]),
+                n_quantiles=min(n_quantiles, X.shape[0]),
                 random_state=self.random_state
             )
             qt.fit(X[[col]])
+            if references is not None and not np.array_equal(qt.references_, references):
+                # Строк меньше, чем узлов сетки: квантили интерполируются на общую сетку
+                qt.quantiles_ = np.interp(references, qt.references_, qt.quantiles_[:, 0])[:, np.newaxis]
+                qt.references_ = np.array(references, dtype=np.float64)
+                qt.n_quantiles_ = len(references)
             self.quantile_transformers[col] = qt
 
+        self.quantile_table_ = QuantileTable.from_transformers(self.quantile_transformers)
+
+    def quantile_shift(self, X: pd.DataFrame) -> dict:
+        """PSI каждой numeric-колонки X относительно обученных квантилей."""
+        columns = self.quantile_table.columns
+        return self.quantile_table.psi(X[columns].to_numpy(dtype=np.float64), columns)
+
+    def refit_quantiles(self, X: pd.DataFrame, columns) -> 'FeaturePreprocessor':
+        """
+        Переобучает квантильные таблицы только для указанных колонок на сетке текущей таблицы
+        (при любом числе строк X); остальное состояние не меняется.
+        """
+        self._fit_quantiles(X, list(columns), self.quantile_table.references)
         return self
 
-    def transform(self, X: pd.DataFrame) -> pd.DataFrame:
-        X = X.copy()
-        result = pd.DataFrame(index=X.index)
-
-        for col in self.numeric_columns_:
-            qt = self.quantile_transformers.get(col)
-            if qt:
-                result[f'{col}_qt'] = qt.transform(X[[col]]).flatten()
-
-        for col in self.timestamp_columns:
-            ts = pd.to_datetime(X[col], unit='s')
-            prefix = col
-            temp = {}
-
-            if 'day' in self.timestamp_features[col]:
-                temp[f'{prefix}_day'] = ts.dt.day
-            if 'dayofweek' in self.timestamp_features[col]:
-                temp[f'{prefix}_dayofweek'] = ts.dt.dayofweek
-            if 'dayofyear' in self.timestamp_features[col]:
-                temp[f'{prefix}_dayofyear'] = ts.dt.dayofyear
-            if 'week' in self.timestamp_features[col]:
-                temp[f'{prefix}_week'] = ts.dt.isocalendar().week
-            if 'hour' in self.timestamp_features[col]:
-                temp[f'{prefix}_hour'] = ts.dt.hour
-            if 'minute' in self.timestamp_features[col]:
-                temp[f'{prefix}_minute'] = ts.dt.minute
-            if 'second' in self.timestamp_features[col]:
-                temp[f'{prefix}_second'] = ts.dt.second
-            if 'hour_sin' in self.timestamp_features[col]:
-                temp[f'{prefix}_hour_sin'] = np.sin(2 * np.pi * ts.dt.hour / 24)
-            if 'hour_cos' in self.timestamp_features[col]:
-                temp[f'{prefix}_hour_cos'] = np.cos(2 * np.pi * ts.dt.hour / 24)
-
-            temp_df = pd.DataFrame(temp)
-            result = pd.concat([result, temp_df], axis=1)
-
-        return result
+    @property
+    def quantile_table(self) -> QuantileTable:
+        """Таблица квантилей; для препроцессоров, сохранённых до её появления, строится при первом обращении."""
+        table = self.__dict__.get('quantile_table_')
+        if table is None:
+            table = QuantileTable.from_transformers(self.quantile_transformers)
+            self.quantile_table_ = table
+        return table
 
     def save(self, path: str):
-        with open(path, "wb") as f:
-            cloudpickle.dump(self, f)
+        def write(tmp_path: str):
+            with open(tmp_path, "wb") as f:
+                cloudpickle.dump(self, f)
+
+        save_atomic(path, write)
 
     @classmethod
     def load(cls, path: str):
         with open(path, "rb") as f:
             return cloudpickle.load(f)
-
-
-class DataPreprocessor:
-    COLUMNS = [
-        'repay_amount_sum_eth',
-        'risk_factor',
-        'max_risk_factor',
-        'avg_risk_factor',
-        'total_available_borrows_avg_eth',
-        'time_since_first_deposit',
-        'borrow_block_number',
-        'risk_factor_above_threshold_daily_count',
-        'market_atr',
-        'borrow_count',
-        'wallet_age',
-        'borrow_amount_avg_eth',
-        'repay_count',
-        'min_eth_ever',
-        'deposit_amount_sum_eth',
-        'total_available_borrows_eth',
-        'incoming_tx_avg_eth',
-        'avg_weighted_risk_factor',
-        'total_collateral_avg_eth',
-        'withdraw_amount_sum_eth',
-        'market_natr',
-        'market_adxr',
-        'risky_first_tx_timestamp',
-        'risky_tx_count',
-        'outgoing_tx_count',
-        'incoming_tx_count',
-        'risky_sum_outgoing_amount_eth',
-        'market_aroonosc',
-        'risky_unique_contract_count',
-        'market_macdsignal_macdfix',
-        'max_eth_ever',
-        'deposit_count',
-        'total_balance_eth',
-        'time_since_last_liquidated',
-        'market_plus_dm',
-        'repay_amount_avg_eth',
-        'first_tx_timestamp',
-        'total_collateral_eth',
-        'total_gas_paid_eth',
-        'risky_first_last_tx_timestamp_diff',
-        'borrow_repay_diff_eth',
-        'liquidation_amount_sum_eth',
-        'outgoing_tx_sum_eth',
-        'outgoing_tx_avg_eth',
-        'liquidation_count',
-        'incoming_tx_sum_eth',
-        'market_macd_macdfix',
-        'borrow_amount_sum_eth',
-        'market_apo',
-        'market_linearreg_slope',
-        'withdraw_deposit_diff_if_positive_eth',
-        'market_cmo',
-        'unique_lending_protocol_count',
-        'market_macdsignal_macdext',
-        'unique_borrow_protocol_count',
-        'market_adx',
-        'market_cci',
-        'market_fastk',
-    ]
-
-    def data_preprocessing(self, df: pd.DataFrame, feature_preprocessor: FeaturePreprocessor) -> pd.DataFrame:
-        return pd.concat([df, feature_preprocessor.transform(df)], axis=1)[self.COLUMNS]
@@ -0,0 +1,137 @@
+# scripts/dataset_io.py
+
+import os
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+# Файл-индекс сплита хранит только номера строк исходного parquet (без копии данных)
+INDEX_SUFFIX = ".index.parquet"
+FEATHER_SUFFIXES = (".feather", ".arrow")
+DATASET_SUFFIXES = (INDEX_SUFFIX, ".parquet", ".csv") + FEATHER_SUFFIXES
+
+
+def write_dataset(df: pd.DataFrame, path: str):
+    """Сохраняет DataFrame с сохранением типов: Feather/Arrow (без сжатия — для memory map), Parquet или CSV."""
+    if path.endswith(FEATHER_SUFFIXES):
+        feather.write_feather(df.reset_index(drop=True), path, compression="uncompressed")
+    elif path.endswith(".parquet"):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def write_split_index(rows: np.ndarray, raw_path: str, path: str):
+    """
+    Сохраняет сплит как индекс строк поверх исходного parquet.
+    Строки хранятся в порядке сплита (как у X.iloc[rows] в остальных форматах).
+    """
+    table = pa.table({"row": pa.array(np.asarray(rows, dtype=np.int64))})
+    table = table.replace_schema_metadata({"raw_path": os.path.relpath(raw_path, os.path.dirname(path) or ".")})
+    pq.write_table(table, path)
+
+
+def read_split_index(path: str):
+    table = pq.read_table(path)
+    raw_path = table.schema.metadata[b"raw_path"].decode()
+    raw_path = os.path.normpath(os.path.join(os.path.dirname(path) or ".", raw_path))
+    return table.column("row").to_numpy(), raw_path
+
+
+def _row_group_starts(raw: pq.ParquetFile) -> np.ndarray:
+    """Номер первой строки каждого row group и общее число строк последним элементом."""
+    sizes = [raw.metadata.row_group(i).num_rows for i in range(raw.num_row_groups)]
+    return np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)])
+
+
+def _existing(columns: Optional[List[str]], names: List[str]) -> Optional[List[str]]:
+    return None if columns is None else [col for col in columns if col in names]
+
+
+def read_schema(path: str) -> pa.Schema:
+    """Схема датасета без чтения данных; в CSV типов нет — все колонки считаются строковыми."""
+    if path.endswith(INDEX_SUFFIX):
+        _, raw_path = read_split_index(path)
+        return pq.read_schema(raw_path)
+    if path.endswith(FEATHER_SUFFIXES):
+        return pa.ipc.open_file(pa.memory_map(path, "r")).schema
+    if path.endswith(".parquet"):
+        return pq.read_schema(path)
+    return pa.schema([(col, pa.string()) for col in pd.read_csv(path, nrows=0).columns])
+
+
+def read_table(path: str, columns: Optional[List[str]] = None) -> pa.Table:
+    """Читает датасет как Arrow-таблицу; Feather/Arrow и Parquet открываются через memory map."""
+    if path.endswith(INDEX_SUFFIX):
+        # Читаются только row group'ы, в которых есть строки сплита; порядок строк — порядок сплита
+        rows, raw_path = read_split_index(path)
+        raw = pq.ParquetFile(raw_path, memory_map=True)
+        columns = _existing(columns, raw.schema_arrow.names)
+        if not rows.size:
+            schema = raw.schema_arrow
+            return (schema if columns is None else pa.schema([schema.field(col) for col in columns])).empty_table()
+
+        starts = _row_group_starts(raw)
+        row_groups = np.searchsorted(starts, rows, side="right") - 1
+        needed = np.unique(row_groups)
+        table = raw.read_row_groups(needed.tolist(), columns=columns)
+        # Начало каждого прочитанного row group внутри склеенной таблицы
+        read_starts = np.concatenate([[0], np.cumsum(np.diff(starts)[needed])[:-1]])
+        return table.take(rows - starts[row_groups] + read_starts[np.searchsorted(needed, row_groups)])
+
+    if path.endswith(FEATHER_SUFFIXES):
+        # Без сжатия буферы таблицы ссылаются прямо на отображённый в память файл
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        return table if columns is None else table.select(_existing(columns, table.column_names))
+
+    if path.endswith(".parquet"):
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        return parquet_file.read(columns=_existing(columns, parquet_file.schema_arrow.names))
+
+    return pa.Table.from_pandas(read_dataset(path, columns), preserve_index=False)
+
+
+def read_dataset(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Читает датасет в DataFrame; формат определяется по расширению."""
+    if path.endswith(".csv"):
+        usecols = (lambda col: col in columns) if columns is not None else None
+        return pd.read_csv(path, usecols=usecols)
+    return read_table(path, columns).to_pandas(split_blocks=True)
+
+
+def iter_chunks(path: str, chunk_size: int, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """Читает датасет кусками не больше chunk_size строк."""
+    if path.endswith(".csv"):
+        usecols = (lambda col: col in columns) if columns is not None else None
+        yield from pd.read_csv(path, chunksize=chunk_size, usecols=usecols)
+
+    elif path.endswith(INDEX_SUFFIX):
+        # В памяти одновременно не больше одного row group исходного файла; строки идут
+        # в порядке исходного файла, поэтому сортируется копия индекса
+        rows, raw_path = read_split_index(path)
+        rows = np.sort(rows)
+        raw = pq.ParquetFile(raw_path, memory_map=True)
+        columns = _existing(columns, raw.schema_arrow.names)
+        offset = 0
+        for row_group in range(raw.num_row_groups):
+            n_rows = raw.metadata.row_group(row_group).num_rows
+            lo, hi = np.searchsorted(rows, [offset, offset + n_rows])
+            if hi > lo:
+                table = raw.read_row_group(row_group, columns=columns).take(rows[lo:hi] - offset)
+                for batch in table.to_batches(max_chunksize=chunk_size):
+                    yield batch.to_pandas()
+            offset += n_rows
+
+    elif path.endswith(FEATHER_SUFFIXES):
+        table = read_table(path, columns)
+        for batch in table.to_batches(max_chunksize=chunk_size):
+            yield batch.to_pandas()
+
+    else:
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=_existing(columns, parquet_file.schema_arrow.names)):
+            yield batch.to_pandas()
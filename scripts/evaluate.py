@@ -3,85 +3,77 @@
 import os
 import json
 import argparse
+
+import numpy as np
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-
-from sklearn.metrics import (
-    accuracy_score,
-    precision_score,
-    recall_score,
-    f1_score,
-    roc_auc_score,
-    confusion_matrix,
-    roc_curve,
-    precision_recall_curve
-)
-
-
-def evaluate(y_true, y_pred, y_proba, metrics_path: str, plots_dir: str):
-    os.makedirs(plots_dir, exist_ok=True)
-
-    # 1. Вычисление метрик
-    metrics = {
-        "accuracy": accuracy_score(y_true, y_pred),
-        "precision": precision_score(y_true, y_pred),
-        "recall": recall_score(y_true, y_pred),
-        "f1_score": f1_score(y_true, y_pred),
-        "roc_auc": roc_auc_score(y_true, y_proba),
-    }
-
-    # 2. Сохранение метрик в JSON
+
+# Графики (seaborn, matplotlib) — в scripts.plots и импортируются только при отрисовке,
+# поэтому скоринг (scripts.predict) считает метрики без графических библиотек
+from scripts.curves import BinaryCurve, classification_metrics, confusion_counts
+from scripts.dataset_io import iter_chunks, read_dataset
+from scripts.online_metrics import MetricsAccumulator
+from scripts.thresholds import apply_threshold, best_f1_threshold, save_threshold
+
+HIST_BINS = 50
+
+
+def save_sweep(curve: BinaryCurve, sweep_path: str):
+    """Метрики на сетке порогов 0.00..1.00 (правило score > threshold) в CSV."""
+    sweep = curve.sweep()
+    pd.DataFrame(sweep).to_csv(sweep_path, index=False)
+    print(f"🎚️  Лучший F1 = {sweep['f1'].max():.4f} при пороге {best_f1_threshold(sweep):.2f}")
+
+
+def write_report(metrics: dict, cm: np.ndarray, curve: BinaryCurve, hist_counts: np.ndarray,
+                 hist_edges: np.ndarray, metrics_path: str, plots_dir: str,
+                 skip_plots: bool = False, sweep_path: str = None):
+    # Сохранение метрик в JSON
     with open(metrics_path, "w") as f:
         json.dump(metrics, f, indent=4)
 
-    # 3. Confusion Matrix
-    cm = confusion_matrix(y_true, y_pred)
-    plt.figure(figsize=(6, 5))
-    sns.heatmap(cm, annot=True, fmt="d", cmap="Blues")
-    plt.title("Confusion Matrix")
-    plt.xlabel("Predicted")
-    plt.ylabel("True")
-    plt.tight_layout()
-    plt.savefig(os.path.join(plots_dir, "confusion_matrix.png"))
-    plt.close()
-
-    # 4. ROC-кривая
-    fpr, tpr, _ = roc_curve(y_true, y_proba)
-    plt.figure()
-    plt.plot(fpr, tpr, label="ROC Curve")
-    plt.plot([0, 1], [0, 1], linestyle="--", color="gray")
-    plt.xlabel("False Positive Rate")
-    plt.ylabel("True Positive Rate")
-    plt.title("ROC Curve")
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(os.path.join(plots_dir, "roc_curve.png"))
-    plt.close()
-
-    # 5. Precision-Recall кривая
-    precision, recall, _ = precision_recall_curve(y_true, y_proba)
-    plt.figure()
-    plt.plot(recall, precision, label="PR Curve")
-    plt.xlabel("Recall")
-    plt.ylabel("Precision")
-    plt.title("Precision-Recall Curve")
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(os.path.join(plots_dir, "pr_curve.png"))
-    plt.close()
-
-    # 6. Гистограмма вероятностей
-    plt.figure()
-    plt.hist(y_proba, bins=50, color="skyblue", edgecolor="black")
-    plt.title("Prediction Probabilities Histogram")
-    plt.xlabel("Predicted probability")
-    plt.ylabel("Frequency")
-    plt.tight_layout()
-    plt.savefig(os.path.join(plots_dir, "probabilities_hist.png"))
-    plt.close()
-
-    print("✅ Метрики и графики сохранены")
+    if sweep_path:
+        save_sweep(curve, sweep_path)
+
+    if not skip_plots:
+        from scripts.plots import render_plots
+        render_plots(cm, curve, hist_counts, hist_edges, plots_dir)
+
+    print("✅ Метрики и графики сохранены" if not skip_plots else "✅ Метрики сохранены")
+
+
+def evaluate(y_true, y_pred, y_proba, metrics_path: str, plots_dir: str,
+             skip_plots: bool = False, sweep_path: str = None):
+    y_true = np.asarray(y_true)
+    y_proba = np.asarray(y_proba, dtype=np.float64)
+
+    # Одна сортировка вероятностей: из неё ROC, PR, AUC и сетка порогов
+    curve = BinaryCurve.from_scores(y_true, y_proba)
+    cm = confusion_counts(y_true, y_pred)
+    hist_counts, hist_edges = np.histogram(y_proba, bins=HIST_BINS)
+
+    write_report(classification_metrics(cm, curve.roc_auc_or_none()), cm, curve, hist_counts, hist_edges,
+                 metrics_path, plots_dir, skip_plots, sweep_path)
+    return curve
+
+
+def evaluate_accumulated(accumulator: MetricsAccumulator, metrics_path: str, plots_dir: str,
+                         skip_plots: bool = False, sweep_path: str = None):
+    """Отчёт по накопленным гистограммам: AUC и кривые приближённые, остальные метрики точные."""
+    curve = accumulator.curve()
+    write_report(accumulator.metrics(), accumulator.confusion, curve,
+                 *accumulator.histogram(HIST_BINS), metrics_path, plots_dir, skip_plots, sweep_path)
+    return curve
+
+
+def evaluate_chunked(input_path: str, metrics_path: str, plots_dir: str, chunk_size: int,
+                     threshold: float = None, skip_plots: bool = False, sweep_path: str = None):
+    """Оценка result.csv / result.parquet по чанкам: память ограничена размером чанка."""
+    accumulator = MetricsAccumulator()
+    for chunk in iter_chunks(input_path, chunk_size, ["y_true", "y_pred", "y_proba"]):
+        y_pred = chunk["y_pred"] if threshold is None else apply_threshold(chunk["y_proba"], threshold)
+        accumulator.update(chunk["y_true"], y_pred, chunk["y_proba"])
+
+    return evaluate_accumulated(accumulator, metrics_path, plots_dir, skip_plots, sweep_path)
 
 
 if __name__ == "__main__":
@@ -93,7 +85,7 @@ if __name__ == "__main__":
         "--input_csv",
         type=str,
         default=os.path.join("Data", "processed", "predictions", "result.csv"),
-        help="📂 CSV с колонками y_true, y_pred, y_proba"
+        help="📂 CSV или parquet с колонками y_true, y_pred, y_proba"
     )
     parser.add_argument(
         "--metrics_path",
@@ -101,18 +93,73 @@ if __name__ == "__main__":
         default=os.path.join("models", "metrics.json"),
         help="💾 Путь для сохранения метрик (JSON)"
     )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=None,
+        help="🎚️ Пересчитать y_pred из y_proba по этому порогу (без повторного скоринга)"
+    )
     parser.add_argument(
         "--plots_dir",
         type=str,
         default=os.path.join("plots"),
         help="📁 Папка для сохранения графиков"
     )
+    parser.add_argument(
+        "--skip_plots",
+        action="store_true",
+        help="⏭️ Только метрики, без графиков"
+    )
+    parser.add_argument(
+        "--sweep_path",
+        type=str,
+        default=None,
+        help="🎚️ CSV с precision/recall/F1 на сетке порогов 0.00..1.00"
+    )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=None,
+        help="📏 Оценка по чанкам этого размера (ограниченная память, приближённые AUC и кривые)"
+    )
+    parser.add_argument(
+        "--save_threshold",
+        type=str,
+        default=None,
+        metavar="MODEL_PATH",
+        help="💾 Сохранить порог рядом с моделью: --threshold, если задан, иначе порог с лучшим F1",
+    )
 
-    df = pd.read_csv(args.input_csv)
-    y_true = df["y_true"].values
-    y_pred = df["y_pred"].values
-    y_proba = df["y_proba"].values
+    args = parser.parse_args()
 
-    evaluate(y_true, y_pred, y_proba, metrics_path=args.metrics_path, plots_dir=args.plots_dir)
+    if args.chunk_size:
+        curve = evaluate_chunked(
+            args.input_csv,
+            metrics_path=args.metrics_path,
+            plots_dir=args.plots_dir,
+            chunk_size=args.chunk_size,
+            threshold=args.threshold,
+            skip_plots=args.skip_plots,
+            sweep_path=args.sweep_path,
+        )
+    else:
+        df = read_dataset(args.input_csv, ["y_true", "y_pred", "y_proba"])
+        y_true = df["y_true"].values
+        y_pred = df["y_pred"].values
+        y_proba = df["y_proba"].values
+        if args.threshold is not None:
+            y_pred = apply_threshold(y_proba, args.threshold)
+
+        curve = evaluate(
+            y_true, y_pred, y_proba,
+            metrics_path=args.metrics_path,
+            plots_dir=args.plots_dir,
+            skip_plots=args.skip_plots,
+            sweep_path=args.sweep_path,
+        )
+
+    if args.save_threshold:
+        threshold = args.threshold if args.threshold is not None else best_f1_threshold(curve.sweep())
+        save_threshold(args.save_threshold, threshold)
+        print(f"🎚️  Порог {threshold:.2f} сохранён рядом с моделью {args.save_threshold}")
@@ -0,0 +1,87 @@
+# scripts/fast_predictor.py
+
+import threading
+from typing import Any, Dict, Sequence, Union
+
+import numpy as np
+
+from scripts.thresholds import DEFAULT_THRESHOLD
+from scripts.timestamp_features import fill_timestamp_features
+
+
+class FastPredictor:
+    """
+    Быстрый путь инференса для одиночных записей — без pandas.
+
+    При создании по обученному FeaturePreprocessor и порядку колонок модели строится
+    план: какие сырые поля копируются как есть, какие проходят квантильное
+    преобразование и какие timestamp-признаки считаются. Запись (dict или
+    последовательность в порядке ``input_columns``) раскладывается прямо в
+    предвыделенный float32-вектор в порядке колонок модели.
+    """
+
+    def __init__(self, model, feature_preprocessor, columns: Sequence[str]):
+        self.model = model
+        self.feature_preprocessor = feature_preprocessor
+        self.columns = list(columns)
+        self.classes = np.asarray(model.classes_)
+
+        qt_columns, ts_plan = feature_preprocessor.plan(self.columns)
+        position = {col: i for i, col in enumerate(self.columns)}
+
+        self._qt_columns = qt_columns
+        self._qt_positions = [position[f'{col}_qt'] for col in qt_columns]
+        self._ts_plan = [
+            (col, features, [position[f'{col}_{feature}'] for feature in features])
+            for col, features in ts_plan
+        ]
+
+        derived = set(self._qt_positions) | {p for _, _, positions in self._ts_plan for p in positions}
+        self._raw = [(i, col) for i, col in enumerate(self.columns) if i not in derived]
+
+        self.input_columns = list(dict.fromkeys(
+            [col for _, col in self._raw] + qt_columns + [col for col, _, _ in self._ts_plan]
+        ))
+        self._local = threading.local()
+
+    def _buffer(self) -> np.ndarray:
+        # Свой буфер на поток: предсказания из пула потоков не должны делить память
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = self._local.buffer = np.empty((1, len(self.columns)), dtype=np.float32)
+        # CatBoost помечает входной массив read-only на время построения пула; буфер принадлежит нам
+        buffer.flags.writeable = True
+        return buffer
+
+    def vectorize(self, record: Union[Dict[str, Any], Sequence[float]], out: np.ndarray = None) -> np.ndarray:
+        """Вектор признаков (1, n_columns) float32 в порядке колонок модели."""
+        if not isinstance(record, dict):
+            record = dict(zip(self.input_columns, record))
+        out = self._buffer() if out is None else out
+        row = out[0]
+
+        for i, col in self._raw:
+            value = record[col]
+            row[i] = np.nan if value is None else value
+
+        if self._qt_columns:
+            values = np.array([[np.nan if record[col] is None else record[col] for col in self._qt_columns]], dtype=np.float64)
+            row[self._qt_positions] = self.feature_preprocessor.quantile_table.transform(values, self._qt_columns)[0]
+
+        for col, features, positions in self._ts_plan:
+            value = record[col]
+            tmp = np.empty((1, len(features)), dtype=np.float64)
+            fill_timestamp_features(np.array([np.nan if value is None else value]), features, tmp)
+            row[positions] = tmp[0]
+
+        return out
+
+    def predict_proba(self, record) -> float:
+        """Вероятность мошенничества для одной записи."""
+        proba = self.model.predict_proba(self.vectorize(record), thread_count=1)
+        return float(proba[0, 1])
+
+    def predict(self, record, threshold: float = DEFAULT_THRESHOLD) -> int:
+        """Класс для одной записи: вероятность строго больше порога (как apply_threshold)."""
+        proba = self.model.predict_proba(self.vectorize(record), thread_count=1)
+        return int(self.classes[int(proba[0, 1] > threshold)])
@@ -0,0 +1,132 @@
+# scripts/feature_store.py
+
+import os
+import json
+import hashlib
+from typing import Callable, List, Optional
+
+import pandas as pd
+import pyarrow.feather as feather
+
+from scripts.dataset_io import INDEX_SUFFIX, read_split_index
+from scripts.feature_transform import FEATURE_TRANSFORM_VERSION, FeatureTransformMixin
+from scripts.model_registry import file_sha256
+
+
+def dataset_fingerprint(path: str, file_hash: Callable[[str], str] = file_sha256) -> str:
+    """Хэш входного датасета; для файла-индекса учитывается и исходный parquet."""
+    digest = file_hash(path)
+    if path.endswith(INDEX_SUFFIX):
+        _, raw_path = read_split_index(path)
+        digest = hashlib.sha256((digest + file_hash(raw_path)).encode()).hexdigest()
+    return digest
+
+
+class FeatureStore:
+    """
+    Дисковый кэш результата DataPreprocessor.data_preprocessing.
+
+    Ключ — хэш входного файла, отпечаток обученного FeaturePreprocessor, версия кода
+    признаков (FEATURE_TRANSFORM_VERSION) и список колонок. Хэши входных файлов запоминаются
+    в ``fingerprints.json`` вместе с размером и mtime и пересчитываются, только если те изменились.
+    Записи хранятся в Feather (без сжатия); при попадании mtime записи обновляется,
+    и при превышении ``max_bytes`` или ``max_entries`` удаляются давно не использованные (LRU).
+    """
+
+    SUFFIX = ".feather"
+    FINGERPRINTS = "fingerprints.json"
+
+    def __init__(self, cache_dir: str, max_bytes: int = 10 * 1024 ** 3, max_entries: int = 32):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def file_fingerprint(self, path: str) -> str:
+        """SHA-256 файла; при тех же размере и mtime берётся из fingerprints.json без чтения файла."""
+        stat = os.stat(path)
+        fingerprints_path = os.path.join(self.cache_dir, self.FINGERPRINTS)
+        fingerprints = {}
+        if os.path.exists(fingerprints_path):
+            with open(fingerprints_path) as f:
+                fingerprints = json.load(f)
+
+        entry = fingerprints.get(os.path.abspath(path))
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["sha256"]
+
+        digest = file_sha256(path)
+        fingerprints[os.path.abspath(path)] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+        tmp_path = f"{fingerprints_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(fingerprints, f, indent=2)
+        os.replace(tmp_path, fingerprints_path)
+        return digest
+
+    def dataset_fingerprint(self, path: str) -> str:
+        """dataset_fingerprint через кэш отпечатков файлов."""
+        return dataset_fingerprint(path, self.file_fingerprint)
+
+    def key(self, input_path: str, feature_preprocessor: FeatureTransformMixin, columns: List[str],
+            fingerprint: Optional[str] = None) -> str:
+        payload = {
+            "input": fingerprint or self.dataset_fingerprint(input_path),
+            "preprocessor": feature_preprocessor.fingerprint(),
+            "transform_version": FEATURE_TRANSFORM_VERSION,
+            "columns": list(columns),
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + self.SUFFIX)
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        os.utime(path)  # отметка использования для LRU
+        return feather.read_feather(path, memory_map=True)
+
+    def put(self, key: str, df: pd.DataFrame):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        feather.write_feather(df.reset_index(drop=True), tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """Удаляет самые старые по использованию записи, пока кэш не уложится в лимиты."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(self.SUFFIX):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        while entries and (total > self.max_bytes or len(entries) > self.max_entries):
+            _, size, name = entries.pop(0)
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+
+    def get_or_compute(
+        self,
+        input_path: str,
+        feature_preprocessor: FeatureTransformMixin,
+        columns: List[str],
+        compute: Callable[[], pd.DataFrame],
+        fingerprint: Optional[str] = None,
+    ) -> pd.DataFrame:
+        """
+        Признаки из кэша по ключу или вычисленные через ``compute`` и сохранённые в кэш.
+        ``fingerprint`` — уже посчитанный отпечаток входного файла, чтобы не пересчитывать его.
+        """
+        key = self.key(input_path, feature_preprocessor, columns, fingerprint)
+        cached = self.get(key)
+        if cached is not None:
+            print(f"♻️  Признаки из кэша: {key[:12]}")
+            return cached
+
+        df = compute()
+        self.put(key, df)
+        return df
@@ -0,0 +1,158 @@
+# scripts/feature_transform.py
+
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+from scripts.instrumentation import metrics
+from scripts.timestamp_features import fill_timestamp_features, ordered_features
+
+# Версия кода построения признаков: входит в ключ FeatureStore.
+# Увеличивать при любом изменении transform / DataPreprocessor, меняющем результат
+FEATURE_TRANSFORM_VERSION = 1
+
+
+class FeatureTransformMixin:
+    """
+    Построение признаков по обученному состоянию — без sklearn.
+
+    Общая часть FeaturePreprocessor (обучение, sklearn) и CompactPreprocessor (инференс).
+    Наследник задаёт ``timestamp_columns``, ``timestamp_features``, ``numeric_columns_``
+    и ``quantile_table``.
+    """
+
+    def plan(self, columns=None):
+        """
+        План вычислений: какие quantile- и timestamp-признаки нужны для ``columns``.
+
+        Возвращает (список numeric-колонок для квантильного преобразования,
+        список пар (timestamp-колонка, признаки)). При ``columns=None`` — все признаки.
+        """
+        table_columns = set(self.quantile_table.columns)
+        qt_columns = [col for col in self.numeric_columns_ if col in table_columns]
+        ts_plan = [(col, ordered_features(self.timestamp_features[col])) for col in self.timestamp_columns]
+
+        if columns is not None:
+            required = set(columns)
+            qt_columns = [col for col in qt_columns if f'{col}_qt' in required]
+            ts_plan = [
+                (col, [feature for feature in features if f'{col}_{feature}' in required])
+                for col, features in ts_plan
+            ]
+            ts_plan = [(col, features) for col, features in ts_plan if features]
+
+        return qt_columns, ts_plan
+
+    def transform(self, X: pd.DataFrame, columns=None) -> pd.DataFrame:
+        """Строит признаки; если задан ``columns``, считаются только входящие в него."""
+        qt_columns, ts_plan = self.plan(columns)
+
+        names = [f'{col}_qt' for col in qt_columns]
+        names += [f'{col}_{feature}' for col, features in ts_plan for feature in features]
+
+        # Все признаки пишутся в один предвыделенный массив вместо наращивания DataFrame через pd.concat
+        out = np.empty((len(X), len(names)), dtype=np.float64)
+
+        j = len(qt_columns)
+        if qt_columns:
+            out[:, :j] = self.quantile_table.transform(X[qt_columns].to_numpy(dtype=np.float64), qt_columns)
+
+        for col, features in ts_plan:
+            fill_timestamp_features(X[col].to_numpy(), features, out[:, j:j + len(features)])
+            j += len(features)
+
+        return pd.DataFrame(out, index=X.index, columns=names)
+
+    def fingerprint(self) -> str:
+        """Хэш обученного состояния: конфигурация timestamp-признаков и таблица квантилей."""
+        table = self.quantile_table
+        state = {
+            'timestamp_columns': list(self.timestamp_columns),
+            'timestamp_features': {col: sorted(features) for col, features in self.timestamp_features.items()},
+            'numeric_columns': list(self.numeric_columns_),
+            'quantile_columns': table.columns,
+            'output_distribution': table.output_distribution,
+        }
+        digest = hashlib.sha256(json.dumps(state, sort_keys=True).encode())
+        digest.update(table.quantiles.tobytes())
+        digest.update(table.references.tobytes())
+        return digest.hexdigest()
+
+
+class DataPreprocessor:
+    COLUMNS = [
+        'repay_amount_sum_eth',
+        'risk_factor',
+        'max_risk_factor',
+        'avg_risk_factor',
+        'total_available_borrows_avg_eth',
+        'time_since_first_deposit',
+        'borrow_block_number',
+        'risk_factor_above_threshold_daily_count',
+        'market_atr',
+        'borrow_count',
+        'wallet_age',
+        'borrow_amount_avg_eth',
+        'repay_count',
+        'min_eth_ever',
+        'deposit_amount_sum_eth',
+        'total_available_borrows_eth',
+        'incoming_tx_avg_eth',
+        'avg_weighted_risk_factor',
+        'total_collateral_avg_eth',
+        'withdraw_amount_sum_eth',
+        'market_natr',
+        'market_adxr',
+        'risky_first_tx_timestamp',
+        'risky_tx_count',
+        'outgoing_tx_count',
+        'incoming_tx_count',
+        'risky_sum_outgoing_amount_eth',
+        'market_aroonosc',
+        'risky_unique_contract_count',
+        'market_macdsignal_macdfix',
+        'max_eth_ever',
+        'deposit_count',
+        'total_balance_eth',
+        'time_since_last_liquidated',
+        'market_plus_dm',
+        'repay_amount_avg_eth',
+        'first_tx_timestamp',
+        'total_collateral_eth',
+        'total_gas_paid_eth',
+        'risky_first_last_tx_timestamp_diff',
+        'borrow_repay_diff_eth',
+        'liquidation_amount_sum_eth',
+        'outgoing_tx_sum_eth',
+        'outgoing_tx_avg_eth',
+        'liquidation_count',
+        'incoming_tx_sum_eth',
+        'market_macd_macdfix',
+        'borrow_amount_sum_eth',
+        'market_apo',
+        'market_linearreg_slope',
+        'withdraw_deposit_diff_if_positive_eth',
+        'market_cmo',
+        'unique_lending_protocol_count',
+        'market_macdsignal_macdext',
+        'unique_borrow_protocol_count',
+        'market_adx',
+        'market_cci',
+        'market_fastk',
+    ]
+
+    def __init__(self, columns=None):
+        self.columns = list(columns) if columns is not None else self.COLUMNS
+
+    def data_preprocessing(self, df: pd.DataFrame, feature_preprocessor: FeatureTransformMixin) -> pd.DataFrame:
+        # Считаются только признаки, которые реально попадают в self.columns
+        with metrics.timer("transform"):
+            features = feature_preprocessor.transform(df, columns=self.columns)
+
+        with metrics.timer("select"):
+            if features.shape[1] == 0:
+                return df[self.columns]
+
+            raw_columns = [col for col in self.columns if col not in features.columns]
+            return pd.concat([df[raw_columns], features], axis=1)[self.columns]
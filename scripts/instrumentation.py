@@ -0,0 +1,191 @@
+# scripts/instrumentation.py
+
+import os
+import sys
+import time
+import bisect
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+# Выключается METRICS_ENABLED=0: таймеры становятся пустыми контекстами
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Границы корзин, секунды: от 50 мкс до 10 с
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0,
+)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 1024, 10_000, 100_000, 1_000_000)
+
+
+class Histogram:
+    """Кумулятивная гистограмма в стиле Prometheus: счётчики по корзинам, сумма и число наблюдений."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[list, float, int]:
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """
+    Процессный реестр метрик: гистограммы с метками и гейджи-колбэки.
+    ``render`` отдаёт текстовый формат Prometheus для эндпоинта /metrics.
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED, prefix: str = "fraud"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self._histograms: Dict[Tuple[str, tuple], Histogram] = {}
+        self._help: Dict[str, str] = {}
+        self._gauges: Dict[str, Tuple[Callable[[], float], str]] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, help: str = "", buckets=LATENCY_BUCKETS, **labels) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(buckets))
+                self._help.setdefault(name, help)
+        return histogram
+
+    def observe(self, name: str, value: float, help: str = "", buckets=LATENCY_BUCKETS, **labels):
+        if self.enabled:
+            self.histogram(name, help, buckets, **labels).observe(value)
+
+    def stage(self, stage: str) -> Histogram:
+        return self.histogram("stage_seconds", "Время этапов обработки запроса, с", stage=stage)
+
+    def observe_stage(self, stage: str, seconds: float):
+        if self.enabled:
+            self.stage(stage).observe(seconds)
+
+    def timer(self, stage: str):
+        """Контекст, замеряющий время этапа в гистограмму stage_seconds{stage=...}."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self.stage(stage))
+
+    def gauge(self, name: str, fn: Callable[[], float], help: str = ""):
+        """Гейдж, значение которого читается колбэком в момент запроса /metrics."""
+        self._gauges[name] = (fn, help)
+
+    def render(self) -> str:
+        lines = []
+        by_name: Dict[str, list] = {}
+        for (name, labels), histogram in list(self._histograms.items()):
+            by_name.setdefault(name, []).append((labels, histogram))
+
+        for name, series in sorted(by_name.items()):
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {full_name} {self._help.get(name, '')}")
+            lines.append(f"# TYPE {full_name} histogram")
+            for labels, histogram in series:
+                counts, total, count = histogram.snapshot()
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f"{full_name}_bucket{_labels(labels, le=le)} {cumulative}")
+                lines.append(f"{full_name}_sum{_labels(labels)} {total}")
+                lines.append(f"{full_name}_count{_labels(labels)} {count}")
+
+        for name, (fn, help) in sorted(self._gauges.items()):
+            full_name = f"{self.prefix}_{name}"
+            lines.append(f"# HELP {full_name} {help}")
+            lines.append(f"# TYPE {full_name} gauge")
+            lines.append(f"{full_name} {float(fn())}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: tuple, **extra) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+metrics = Metrics()
+
+
+# === Сэмплирующий профайлер ===
+def sample_stacks(seconds: float, interval: float = 0.005) -> Counter:
+    """
+    Каждые interval секунд снимает стеки всех потоков процесса (кроме своего)
+    через sys._current_frames; возвращает счётчик свёрнутых стеков.
+    """
+    own = threading.get_ident()
+    stacks = Counter()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            stacks[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def profile(seconds: float, interval: float = 0.005, output_dir: Optional[str] = None) -> str:
+    """
+    Профиль в формате collapsed stacks (вход для flamegraph.pl и speedscope).
+    Если задан output_dir, профиль дополнительно сохраняется в файл *.folded.
+    """
+    stacks = sample_stacks(seconds, interval)
+    folded = "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f"profile-{datetime.now():%Y%m%d-%H%M%S}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(folded)
+    return folded
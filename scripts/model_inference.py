@@ -1,15 +1,38 @@
 # scripts/model_inference.py
 
 import os
-import joblib
+import time
+import argparse
+from typing import Optional
+
+import numpy as np
 import pandas as pd
-from catboost import CatBoostClassifier
+from concurrent.futures import ProcessPoolExecutor
+from catboost import CatBoostClassifier, Pool
+
+from scripts.compact_preprocessor import COMPACT_SUFFIX, CompactPreprocessor, resolve_preprocessor_path
+from scripts.feature_transform import DataPreprocessor, FeatureTransformMixin
+from scripts.instrumentation import metrics
+from scripts.model_registry import registry
+from scripts.fast_predictor import FastPredictor
+from scripts.result_cache import record_key, result_cache
+from scripts.thresholds import DEFAULT_THRESHOLD, apply_threshold, load_threshold, threshold_path
 
-from scripts.data_preprocessing import DataPreprocessor, FeaturePreprocessor
+# === Пути к моделям (переопределяются переменными окружения) ===
+MODEL_PATH = os.getenv("MODEL_PATH", os.path.join("models", "catboost_model.cbm"))
+# Без PREPROCESSOR_PATH грузится компактный .fpb рядом с pickle (без sklearn и cloudpickle), но только
+# если он сделан из этого pickle; устаревший .fpb игнорируется. Переменная окружения задаёт файл явно
+_DEFAULT_PREPROCESSOR_PATH = os.path.join("models", "feature_preprocessor.pkl")
+PREPROCESSOR_PATH = os.getenv("PREPROCESSOR_PATH") or resolve_preprocessor_path(_DEFAULT_PREPROCESSOR_PATH)
 
-# === Пути к моделям ===
-MODEL_PATH = os.path.join("models", "catboost_model.cbm")
-PREPROCESSOR_PATH = os.path.join("models", "feature_preprocessor.pkl")
+# === Объяснения предсказаний (SHAP) ===
+# Без EXPLAIN_THRESHOLD объясняются записи, предсказанные как мошенничество (сохранённый порог модели)
+EXPLAIN_THRESHOLD = float(os.environ["EXPLAIN_THRESHOLD"]) if os.getenv("EXPLAIN_THRESHOLD") else None
+EXPLAIN_TOP_K = int(os.getenv("EXPLAIN_TOP_K", "5"))
+EXPLAIN_TIME_BUDGET_MS = float(os.getenv("EXPLAIN_TIME_BUDGET_MS", "200"))
+EXPLAIN_CHUNK_SIZE = int(os.getenv("EXPLAIN_CHUNK_SIZE", "256"))
+# Пробный первый чанк: по нему измеряется скорость SHAP, следующие чанки подбираются под остаток бюджета
+EXPLAIN_PROBE_SIZE = int(os.getenv("EXPLAIN_PROBE_SIZE", "8"))
 
 
 def load_model(model_path: str) -> CatBoostClassifier:
@@ -19,41 +42,250 @@ def load_model(model_path: str) -> CatBoostClassifier:
     return model
 
 
-def load_preprocessor(preprocessor_path: str) -> FeaturePreprocessor:
-    """Загрузка сохранённого препроцессора признаков."""
+def load_preprocessor(preprocessor_path: str) -> FeatureTransformMixin:
+    """Загрузка сохранённого препроцессора признаков: компактного (.fpb) или cloudpickle."""
+    if preprocessor_path.endswith(COMPACT_SUFFIX):
+        return CompactPreprocessor.load(preprocessor_path)
+    # Pickle тянет sklearn — импортируем только когда он действительно нужен
+    from scripts.data_preprocessing import FeaturePreprocessor
     return FeaturePreprocessor.load(preprocessor_path)
 
 
-def data_preprocess(df: pd.DataFrame, feature_preprocessor: FeaturePreprocessor) -> pd.DataFrame:
+def get_model(model_path: str = None) -> CatBoostClassifier:
+    """Модель CatBoost из процессного реестра (загружается один раз); по умолчанию MODEL_PATH."""
+    return registry.get(model_path or MODEL_PATH, load_model)
+
+
+def get_preprocessor(preprocessor_path: str = None) -> FeatureTransformMixin:
+    """Препроцессор признаков из процессного реестра (загружается один раз); по умолчанию PREPROCESSOR_PATH."""
+    return registry.get(preprocessor_path or PREPROCESSOR_PATH, load_preprocessor)
+
+
+def get_threshold(model_path: str = None) -> float:
+    """
+    Порог решения модели (файл рядом с моделью, как в scripts.predict); читается через реестр
+    и перечитывается при изменении файла. Без файла — DEFAULT_THRESHOLD.
+    """
+    path = threshold_path(model_path or MODEL_PATH)
+    if not os.path.exists(path):
+        return DEFAULT_THRESHOLD
+    return registry.get(path, lambda _: load_threshold(model_path or MODEL_PATH))
+
+
+def labels(model: CatBoostClassifier, proba: np.ndarray) -> np.ndarray:
+    """Классы из вероятностей по сохранённому порогу — одинаково для всех путей инференса."""
+    return np.asarray(model.classes_)[apply_threshold(proba, get_threshold())]
+
+
+_fast_predictor = None
+
+
+def get_fast_predictor() -> FastPredictor:
+    """Быстрый предиктор; пересобирается, если реестр перезагрузил модель или препроцессор."""
+    global _fast_predictor
+    model, feature_preprocessor = get_model(), get_preprocessor()
+    fast = _fast_predictor
+    if fast is None or fast.model is not model or fast.feature_preprocessor is not feature_preprocessor:
+        fast = _fast_predictor = FastPredictor(model, feature_preprocessor, model_columns(model))
+    return fast
+
+
+def predict_record(record: dict) -> int:
+    """Предсказание класса для одной записи по быстрому пути (без pandas)."""
+    with metrics.timer("fast_predict"):
+        return get_fast_predictor().predict(record, get_threshold())
+
+
+def model_version() -> str:
+    """Версия загруженных модели и препроцессора (SHA-256 файлов из реестра) и порог решения."""
+    return f"{registry.version(MODEL_PATH)}:{registry.version(PREPROCESSOR_PATH)}:{get_threshold()}"
+
+
+def cache_key(record: dict) -> str:
+    """Ключ кэша результатов: сырые входные колонки модели (включая timestamp) и версия модели."""
+    return record_key(record, get_fast_predictor().input_columns, model_version())
+
+
+def _invalidate_results(path: str, artifact):
+    # Первая загрузка кэш не трогает, перезагрузка модели или препроцессора — очищает
+    if artifact.loads > 1:
+        result_cache.invalidate()
+
+
+registry.add_reload_listener(_invalidate_results)
+
+
+def validate_record(record: dict):
+    """Все входные колонки модели есть в записи, значения — числа или null (KeyError / ValueError)."""
+    for col in get_fast_predictor().input_columns:
+        if col not in record:
+            raise KeyError(col)
+        value = record[col]
+        if value is not None and not isinstance(value, (int, float)):
+            raise ValueError(f"column {col!r} must be a number or null, got {type(value).__name__}")
+
+
+def warmup():
+    """Предзагрузка модели и препроцессора (вызывается при старте сервиса)."""
+    get_preprocessor()
+    get_model()
+
+
+def warmup_prediction():
+    """
+    Прогревочное предсказание по нулевой записи через оба пути (pandas-пайплайн и быстрый):
+    инициализирует пулы потоков CatBoost, буферы FastPredictor и ленивые структуры препроцессора.
+    """
+    record = dict.fromkeys(get_fast_predictor().input_columns, 0.0)
+    predict_record(record)
+    predict(pd.DataFrame([record]))
+
+
+def model_columns(model: CatBoostClassifier) -> list:
+    """Порядок признаков модели (DataPreprocessor.COLUMNS, если модель обучена без имён колонок)."""
+    names = model.feature_names_
+    if not names or all(name.isdigit() for name in names):
+        return DataPreprocessor.COLUMNS
+    return list(names)
+
+
+def data_preprocess(df: pd.DataFrame, feature_preprocessor: FeatureTransformMixin, columns=None) -> pd.DataFrame:
     """Применение полного пайплайна предобработки данных."""
-    return DataPreprocessor().data_preprocessing(df, feature_preprocessor)
+    return DataPreprocessor(columns).data_preprocessing(df, feature_preprocessor)
 
 
 def predict(df: pd.DataFrame) -> list:
     """Предсказание класса для входных данных."""
-    feature_preprocessor = load_preprocessor(PREPROCESSOR_PATH)
-    df_processed = data_preprocess(df, feature_preprocessor)
-    preds = load_model(MODEL_PATH).predict(df_processed)
-    return preds.tolist()
+    model = get_model()
+    df_processed = data_preprocess(df, get_preprocessor(), model_columns(model))
+    with metrics.timer("model"):
+        proba = model.predict_proba(df_processed)[:, 1]
+    return labels(model, proba).tolist()
+
+
+def predict_with_proba(df: pd.DataFrame):
+    """Классы и вероятности мошенничества за один проход модели."""
+    model = get_model()
+    df_processed = data_preprocess(df, get_preprocessor(), model_columns(model))
+    with metrics.timer("model"):
+        proba = model.predict_proba(df_processed)[:, 1]
+    return labels(model, proba), proba
+
+
+def top_contributions(shap_values: np.ndarray, X: pd.DataFrame, top_k: int) -> list:
+    """Для каждой строки — top_k признаков с наибольшим по модулю вкладом SHAP (по убыванию)."""
+    top_k = min(top_k, shap_values.shape[1])
+    magnitude = np.abs(shap_values)
+    top = np.argpartition(-magnitude, top_k - 1, axis=1)[:, :top_k]
+    order = np.take_along_axis(magnitude, top, axis=1).argsort(axis=1)[:, ::-1]
+    top = np.take_along_axis(top, order, axis=1)
+
+    columns = X.columns
+    values = X.to_numpy()
+    return [
+        [
+            {"feature": columns[j], "value": float(values[i, j]), "contribution": float(shap_values[i, j])}
+            for j in row
+        ]
+        for i, row in enumerate(top)
+    ]
+
+
+def explain(X: pd.DataFrame, proba: np.ndarray, top_k: int = EXPLAIN_TOP_K,
+            threshold: Optional[float] = EXPLAIN_THRESHOLD, time_budget_ms: float = EXPLAIN_TIME_BUDGET_MS, chunk_size: int = EXPLAIN_CHUNK_SIZE,
+            probe_size: int = EXPLAIN_PROBE_SIZE) -> list:
+    """
+    Объяснения для уже предобработанных признаков X: top_k вкладов SHAP для строк с
+    вероятностью мошенничества выше threshold (по умолчанию — сохранённый порог модели,
+    то есть для предсказанных как мошенничество), None — для остальных.
+
+    ShapValues считаются одним вызовом CatBoost на чанк. Первый чанк — пробный, из probe_size
+    строк; по измеренной скорости следующие чанки (не больше chunk_size строк) подбираются так,
+    чтобы уложиться в остаток time_budget_ms, так что бюджет превышается в пределах погрешности
+    оценки скорости и времени пробного чанка. Строки, до которых не дошла очередь, получают None.
+    """
+    model = get_model()
+    threshold = get_threshold() if threshold is None else threshold
+    explanations = [None] * len(X)
+    flagged = np.flatnonzero(apply_threshold(proba, threshold))
+    if not flagged.size or top_k <= 0 or time_budget_ms <= 0:
+        return explanations
+
+    budget = time_budget_ms / 1000
+    start = time.perf_counter()
+    size = max(1, min(probe_size, chunk_size))
+    done = 0
+    with metrics.timer("explain"):
+        while done < flagged.size:
+            if done:
+                elapsed = time.perf_counter() - start
+                size = min(chunk_size, int(done / elapsed * (budget - elapsed)))
+                if size <= 0:
+                    break
+
+            rows = flagged[done:done + size]
+            chunk = X.iloc[rows]
+            # Последняя колонка ShapValues — базовое значение (expected value), в топ она не входит
+            shap_values = model.get_feature_importance(Pool(chunk), type="ShapValues")[:, :-1]
+            for i, contributions in zip(rows, top_contributions(shap_values, chunk, top_k)):
+                explanations[i] = contributions
+            done += rows.size
+    return explanations
+
+
+def predict_with_explanations(df: pd.DataFrame, top_k: int = EXPLAIN_TOP_K,
+                              threshold: Optional[float] = EXPLAIN_THRESHOLD, time_budget_ms: float = EXPLAIN_TIME_BUDGET_MS):
+    """Классы, вероятности и объяснения (см. explain) за одну предобработку."""
+    model = get_model()
+    df_processed = data_preprocess(df, get_preprocessor(), model_columns(model))
+    with metrics.timer("model"):
+        proba = model.predict_proba(df_processed)[:, 1]
+    return labels(model, proba), proba, explain(df_processed, proba, top_k, threshold, time_budget_ms)
+
+
+def _predict_file(file_path: str):
+    """Предсказание для одного parquet-файла; ошибка возвращается, а не пробрасывается."""
+    try:
+        return predict(pd.read_parquet(file_path)), None
+    except Exception as e:
+        return None, e
+
+
+def predict_files(file_paths: list, workers: int = 1) -> list:
+    """
+    Предсказания для списка parquet-файлов в исходном порядке: [(предсказания, ошибка)].
+    При workers > 1 файлы обрабатываются пулом процессов, каждый воркер загружает
+    модель и препроцессор один раз (initializer=warmup).
+    """
+    if workers <= 1:
+        return [_predict_file(path) for path in file_paths]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=warmup) as executor:
+        return list(executor.map(_predict_file, file_paths))
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="🔍 Инференс на тестовых parquet-файлах")
+    parser.add_argument("--workers", type=int, default=1, help="🧵 Число процессов")
+    args = parser.parse_args()
+
     # === Инференс на тестовых parquet-файлах ===
     TEST_CASES_DIR = os.path.join("Data", "Test Cases")
     test_files = ["Sample_1.parquet", "Sample_2.parquet", "Sample_3.parquet"]
 
+    existing = []
     for file_name in test_files:
         file_path = os.path.join(TEST_CASES_DIR, file_name)
-
         if not os.path.exists(file_path):
             print(f"⚠️  File not found: {file_path}")
             continue
+        existing.append(file_name)
 
-        print(f"\n=== 🔍 Running prediction for: {file_name} ===")
-        df = pd.read_parquet(file_path)
+    results = predict_files([os.path.join(TEST_CASES_DIR, name) for name in existing], workers=args.workers)
 
-        try:
-            prediction = predict(df)
+    for file_name, (prediction, error) in zip(existing, results):
+        print(f"\n=== 🔍 Running prediction for: {file_name} ===")
+        if error is None:
             print(f"✅ Prediction class: {prediction}")
-        except Exception as e:
-            print(f"❌ Error during prediction for {file_name}: {e}")
+        else:
+            print(f"❌ Error during prediction for {file_name}: {error}")
@@ -0,0 +1,166 @@
+# scripts/model_registry.py
+
+import os
+import time
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Optional
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 содержимого файла (читается блоками)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_atomic(path: str, save: Callable[[str], None]):
+    """
+    Запись файла через временный файл рядом и os.replace: реестр (и любой читатель)
+    видит либо старую, либо полностью записанную новую версию, но не недописанную.
+    """
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        save(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class _Artifact:
+    """Загруженный артефакт и сведения о его версии на диске."""
+
+    __slots__ = ("obj", "mtime_ns", "size", "sha256", "load_time", "loaded_at", "loads")
+
+    def __init__(self, obj, mtime_ns: int, size: int, sha256: str, load_time: float):
+        self.obj = obj
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.sha256 = sha256
+        self.load_time = load_time
+        self.loaded_at = time.time()
+        self.loads = 1
+
+
+class ModelRegistry:
+    """
+    Процессный реестр артефактов (модель, препроцессор).
+
+    Каждый артефакт загружается один раз и отдаётся всем потокам как общая ссылка.
+    При обращении проверяется mtime/размер файла (не чаще, чем раз в
+    ``check_interval`` секунд); если они изменились, сверяется SHA-256 содержимого
+    и при расхождении артефакт перезагружается.
+
+    Если перезагрузка не удалась (файл недописан или удалён), продолжает отдаваться
+    последняя успешно загруженная версия; ошибка видна в ``stats()``, повторная
+    попытка — на следующей проверке. Ошибка первой загрузки пробрасывается.
+    """
+
+    def __init__(self, check_interval: float = 1.0):
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._artifacts: Dict[str, _Artifact] = {}
+        self._last_check: Dict[str, float] = {}
+        self._hits = 0
+        self._misses = 0
+        self._reloads = 0
+        self._reload_errors = 0
+        self._errors: Dict[str, str] = {}
+        self._listeners = []
+
+    def get(self, path: str, loader: Callable[[str], Any]) -> Any:
+        """Возвращает артефакт из кэша, загружая или перезагружая его при необходимости."""
+        key = os.path.abspath(path)
+        now = time.monotonic()
+        artifact = self._artifacts.get(key)
+
+        # Быстрый путь без блокировки: артефакт загружен и проверять диск ещё рано
+        if artifact is not None and now - self._last_check.get(key, 0.0) < self.check_interval:
+            self._hits += 1
+            return artifact.obj
+
+        with self._lock:
+            artifact = self._artifacts.get(key)
+            self._last_check[key] = now
+            try:
+                stat = os.stat(key)
+                if artifact is not None and (stat.st_mtime_ns, stat.st_size) == (artifact.mtime_ns, artifact.size):
+                    self._hits += 1
+                    return artifact.obj
+
+                sha256 = file_sha256(key)
+                if artifact is not None and sha256 == artifact.sha256:
+                    # Файл перезаписан тем же содержимым — перезагрузка не нужна
+                    artifact.mtime_ns, artifact.size = stat.st_mtime_ns, stat.st_size
+                    self._hits += 1
+                    return artifact.obj
+
+                self._misses += 1
+                start = time.perf_counter()
+                obj = loader(key)
+                load_time = time.perf_counter() - start
+            except Exception as e:
+                if artifact is None:
+                    raise
+                # Недописанный или удалённый файл: отдаём прежнюю версию до следующей проверки
+                self._reload_errors += 1
+                self._errors[key] = f"{type(e).__name__}: {e}"
+                return artifact.obj
+
+            self._errors.pop(key, None)
+            if artifact is not None:
+                self._reloads += 1
+                loads = artifact.loads + 1
+            else:
+                loads = 1
+
+            artifact = _Artifact(obj, stat.st_mtime_ns, stat.st_size, sha256, load_time)
+            artifact.loads = loads
+            self._artifacts[key] = artifact
+
+        for listener in list(self._listeners):
+            listener(key, artifact)
+
+        return artifact.obj
+
+    def version(self, path: str) -> Optional[str]:
+        """SHA-256 загруженной версии артефакта (None, если ещё не загружен)."""
+        artifact = self._artifacts.get(os.path.abspath(path))
+        return artifact.sha256 if artifact else None
+
+    def add_reload_listener(self, listener: Callable[[str, _Artifact], None]):
+        """Регистрирует колбэк, вызываемый после каждой (пере)загрузки артефакта."""
+        self._listeners.append(listener)
+
+    def clear(self):
+        with self._lock:
+            self._artifacts.clear()
+            self._last_check.clear()
+
+    def stats(self) -> dict:
+        """Статистика реестра: попадания/промахи и время загрузки артефактов."""
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "reloads": self._reloads,
+                "reload_errors": self._reload_errors,
+                "artifacts": {
+                    path: {
+                        "sha256": a.sha256,
+                        "size": a.size,
+                        "load_time_sec": a.load_time,
+                        "loaded_at": a.loaded_at,
+                        "loads": a.loads,
+                        "last_error": self._errors.get(path),
+                    }
+                    for path, a in self._artifacts.items()
+                },
+            }
+
+
+# === Общий реестр процесса ===
+registry = ModelRegistry(check_interval=float(os.getenv("MODEL_CHECK_INTERVAL", "1.0")))
@@ -0,0 +1,66 @@
+# scripts/online_metrics.py
+
+from typing import Tuple
+
+import numpy as np
+
+from scripts.curves import BinaryCurve, classification_metrics, confusion_counts
+
+# 1000 бинов вероятности: погрешность AUC — в пределах перестановок внутри бина шириной 0.001
+DEFAULT_BINS = 1000
+
+
+class MetricsAccumulator:
+    """
+    Инкрементальные метрики по чанкам (y_true, y_pred, y_proba) в ограниченной памяти.
+
+    Хранит матрицу ошибок и гистограммы вероятностей отдельно для каждого класса.
+    Accuracy, precision, recall и F1 точные; ROC-AUC, PR-AUC и кривые — по бинам
+    гистограммы. Аккумуляторы с разных процессов/чанков складываются через ``merge``.
+    """
+
+    def __init__(self, n_bins: int = DEFAULT_BINS):
+        self.n_bins = n_bins
+        self.edges = np.linspace(0.0, 1.0, n_bins + 1)
+        self.confusion = np.zeros((2, 2), dtype=np.int64)
+        self.pos_hist = np.zeros(n_bins, dtype=np.int64)
+        self.neg_hist = np.zeros(n_bins, dtype=np.int64)
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.confusion.sum())
+
+    def update(self, y_true, y_pred, y_proba) -> "MetricsAccumulator":
+        y_true = np.asarray(y_true) == 1
+        y_proba = np.asarray(y_proba, dtype=np.float64)
+
+        self.confusion += confusion_counts(y_true, y_pred)
+        bins = np.clip((y_proba * self.n_bins).astype(np.int64), 0, self.n_bins - 1)
+        self.pos_hist += np.bincount(bins[y_true], minlength=self.n_bins)
+        self.neg_hist += np.bincount(bins[~y_true], minlength=self.n_bins)
+        return self
+
+    def merge(self, other: "MetricsAccumulator") -> "MetricsAccumulator":
+        if other.n_bins != self.n_bins:
+            raise ValueError(f"Cannot merge accumulators with {self.n_bins} and {other.n_bins} bins")
+        self.confusion += other.confusion
+        self.pos_hist += other.pos_hist
+        self.neg_hist += other.neg_hist
+        return self
+
+    def curve(self) -> BinaryCurve:
+        return BinaryCurve.from_histogram(self.pos_hist, self.neg_hist, self.edges)
+
+    def metrics(self) -> dict:
+        """Метрики в схеме metrics.json; ROC-AUC — null, если во входе один класс."""
+        return classification_metrics(self.confusion, self.curve().roc_auc_or_none())
+
+    def pr_auc(self) -> float:
+        return self.curve().pr_auc()
+
+    def histogram(self, n_bins: int = 50) -> Tuple[np.ndarray, np.ndarray]:
+        """Гистограмма всех вероятностей, укрупнённая до n_bins (n_bins должен делить число бинов)."""
+        if self.n_bins % n_bins:
+            raise ValueError(f"{n_bins} bins do not evenly divide {self.n_bins}")
+        counts = (self.pos_hist + self.neg_hist).reshape(n_bins, -1).sum(axis=1)
+        return counts, self.edges[::self.n_bins // n_bins]
@@ -0,0 +1,84 @@
+# scripts/plots.py
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import seaborn as sns
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from scripts.curves import BinaryCurve, downsample
+
+
+# === Графики: объектный API Figure + Agg, без глобального состояния pyplot ===
+def _save(fig: Figure, path: str):
+    FigureCanvasAgg(fig)
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+def plot_confusion_matrix(cm: np.ndarray, path: str):
+    fig = Figure(figsize=(6, 5))
+    ax = fig.subplots()
+    sns.heatmap(cm, annot=True, fmt="d", cmap="Blues", ax=ax)
+    ax.set_title("Confusion Matrix")
+    ax.set_xlabel("Predicted")
+    ax.set_ylabel("True")
+    _save(fig, path)
+
+
+def plot_roc_curve(fpr: np.ndarray, tpr: np.ndarray, path: str):
+    fig = Figure()
+    ax = fig.subplots()
+    ax.plot(fpr, tpr, label="ROC Curve")
+    ax.plot([0, 1], [0, 1], linestyle="--", color="gray")
+    ax.set_xlabel("False Positive Rate")
+    ax.set_ylabel("True Positive Rate")
+    ax.set_title("ROC Curve")
+    ax.legend()
+    _save(fig, path)
+
+
+def plot_pr_curve(precision: np.ndarray, recall: np.ndarray, path: str):
+    fig = Figure()
+    ax = fig.subplots()
+    ax.plot(recall, precision, label="PR Curve")
+    ax.set_xlabel("Recall")
+    ax.set_ylabel("Precision")
+    ax.set_title("Precision-Recall Curve")
+    ax.legend()
+    _save(fig, path)
+
+
+def plot_probabilities_hist(counts: np.ndarray, edges: np.ndarray, path: str):
+    fig = Figure()
+    ax = fig.subplots()
+    # Гистограмма уже посчитана: рисуем готовые бины весами
+    ax.hist(edges[:-1], bins=edges, weights=counts, color="skyblue", edgecolor="black")
+    ax.set_title("Prediction Probabilities Histogram")
+    ax.set_xlabel("Predicted probability")
+    ax.set_ylabel("Frequency")
+    _save(fig, path)
+
+
+def render_plots(cm: np.ndarray, curve: BinaryCurve, hist_counts: np.ndarray, hist_edges: np.ndarray,
+                 plots_dir: str, workers: int = 4):
+    """
+    Рисует 4 графика параллельно в пуле процессов. Кривые прореживаются до 10k точек,
+    поэтому в воркеры передаются только небольшие массивы.
+    """
+    os.makedirs(plots_dir, exist_ok=True)
+    fpr, tpr = downsample(*curve.roc())
+    precision, recall = downsample(*curve.pr())
+
+    jobs = [
+        (plot_confusion_matrix, cm, os.path.join(plots_dir, "confusion_matrix.png")),
+        (plot_roc_curve, fpr, tpr, os.path.join(plots_dir, "roc_curve.png")),
+        (plot_pr_curve, precision, recall, os.path.join(plots_dir, "pr_curve.png")),
+        (plot_probabilities_hist, hist_counts, hist_edges, os.path.join(plots_dir, "probabilities_hist.png")),
+    ]
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+        futures = [executor.submit(*job) for job in jobs]
+        for future in futures:
+            future.result()
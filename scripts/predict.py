@@ -2,25 +2,65 @@
 
 import os
 import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from catboost import CatBoostClassifier, Pool
 
+from scripts.batch_io import required_columns
+from scripts.data_preprocessing import DataPreprocessor, FeaturePreprocessor
+from scripts.dataset_io import DATASET_SUFFIXES, INDEX_SUFFIX, iter_chunks, read_dataset, read_schema
+from scripts.evaluate import evaluate_accumulated
+from scripts.feature_store import FeatureStore
+from scripts.model_inference import load_model, load_preprocessor, model_columns
+from scripts.online_metrics import MetricsAccumulator
+from scripts.thresholds import DEFAULT_THRESHOLD, apply_threshold, load_segment_thresholds, load_threshold
+
+
+def _label(y_proba, chunk: pd.DataFrame, threshold: float, segments: Optional[dict]):
+    segment_values = chunk[segments["column"]] if segments is not None else None
+    return apply_threshold(y_proba, threshold, segments, segment_values)
 
-def predict(test_path: str, output_path: str, model_path: str):
+
+def predict(
+    test_path: str,
+    output_path: str,
+    model_path: str,
+    preprocessor_path: str,
+    threshold: Optional[float] = None,
+    segment_thresholds_path: Optional[str] = None,
+    feature_cache_dir: Optional[str] = None,
+):
     # 1. Загрузка тестовых данных
-    test = pd.read_csv(test_path)
-    X_test = test.drop(columns=["target"])
+    test = read_dataset(test_path)
     y_test = test["target"]
 
-    # 2. Загрузка обученной модели
-    model = CatBoostClassifier()
-    model.load_model(model_path)
+    # 2. Загрузка обученной модели и препроцессора
+    model = load_model(model_path)
+    feature_preprocessor = load_preprocessor(preprocessor_path)
+
+    # 3. Предобработка — та же, что и при обучении
+    data_preprocessor = DataPreprocessor(model_columns(model))
+    if feature_cache_dir:
+        X_test = FeatureStore(feature_cache_dir).get_or_compute(
+            test_path, feature_preprocessor, data_preprocessor.columns,
+            lambda: data_preprocessor.data_preprocessing(test, feature_preprocessor),
+        )
+    else:
+        X_test = data_preprocessor.data_preprocessing(test, feature_preprocessor)
 
-    # 3. Предсказания
-    y_pred = model.predict(Pool(X_test, y_test))
-    y_proba = model.predict_proba(Pool(X_test, y_test))[:, 1]
+    # 4. Предсказания: один проход модели, метки — по порогу из вероятностей
+    threshold = load_threshold(model_path) if threshold is None else threshold
+    segments = load_segment_thresholds(segment_thresholds_path) if segment_thresholds_path else None
 
-    # 4. Формирование результата
+    y_proba = model.predict_proba(Pool(X_test))[:, 1]
+    y_pred = _label(y_proba, test, threshold, segments)
+
+    # 5. Формирование результата
     result = pd.DataFrame({
         "y_true": y_test,
         "y_pred": y_pred,
@@ -33,6 +73,243 @@ def predict(test_path: str, output_path: str, model_path: str):
     print(f"✅ Предсказания сохранены в {os.path.join(output_path, 'result.csv')}")
 
 
+def score_chunks(
+    chunks: Iterator[pd.DataFrame],
+    model: CatBoostClassifier,
+    feature_preprocessor: FeaturePreprocessor,
+    id_columns: Optional[List[str]] = None,
+    threshold: float = DEFAULT_THRESHOLD,
+    segments: Optional[dict] = None,
+    thread_count: int = -1,
+) -> Iterator[pd.DataFrame]:
+    """Предобрабатывает и скорит каждый чанк; отдаёт DataFrame с результатами чанка."""
+    data_preprocessor = DataPreprocessor(model_columns(model))
+
+    for chunk in chunks:
+        X = data_preprocessor.data_preprocessing(chunk, feature_preprocessor)
+
+        result = pd.DataFrame(index=chunk.index)
+        for col in id_columns or []:
+            result[col] = chunk[col]
+        if "target" in chunk.columns:
+            result["y_true"] = chunk["target"]
+        y_proba = model.predict_proba(Pool(X), thread_count=thread_count)[:, 1]
+        result["y_pred"] = _label(y_proba, chunk, threshold, segments)
+        result["y_proba"] = y_proba
+
+        yield result.reset_index(drop=True)
+
+
+def with_metrics(result: pd.DataFrame, enabled: bool):
+    """(результат, метрики чанка) — метрики считаются там же, где скорится чанк."""
+    if not enabled or "y_true" not in result.columns:
+        return result, None
+    return result, MetricsAccumulator().update(result["y_true"], result["y_pred"], result["y_proba"])
+
+
+def input_files(input_path: str) -> List[str]:
+    """Файл или все файлы датасетов в папке (в отсортированном порядке)."""
+    if os.path.isdir(input_path):
+        return sorted(
+            os.path.join(input_path, name)
+            for name in os.listdir(input_path)
+            if name.endswith(DATASET_SUFFIXES)
+        )
+    return [input_path]
+
+
+def result_schema(paths: List[str], id_columns: Optional[List[str]] = None) -> pa.Schema:
+    """
+    Схема result.parquet, известная до скоринга: id-колонки — с типами входного файла,
+    y_true (если во входе есть target), y_pred int64 и y_proba float64. Типы не зависят
+    от того, что pandas выведет для отдельного чанка (целиком пустая колонка, int против float).
+    """
+    input_schema = read_schema(paths[0])
+    fields = [pa.field(col, input_schema.field(col).type) for col in id_columns or []]
+    if "target" in input_schema.names:
+        fields.append(pa.field("y_true", pa.int64()))
+    fields += [pa.field("y_pred", pa.int64()), pa.field("y_proba", pa.float64())]
+    return pa.schema(fields)
+
+
+def to_table(result: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    """Чанк результата в Arrow-таблицу с приведением к общей схеме файла."""
+    result = result.copy()
+    for field in schema:
+        if pa.types.is_string(field.type) and not pd.api.types.is_string_dtype(result[field.name]):
+            # Значения из CSV могли прочитаться числами — в файле они строки
+            result[field.name] = result[field.name].astype("string")
+    return pa.Table.from_pandas(result, schema=schema, preserve_index=False)
+
+
+# === Параллельный скоринг: состояние процесса-воркера ===
+_worker = {}
+
+
+def scoring_columns(model: CatBoostClassifier, feature_preprocessor, extra_columns: List[str]) -> List[str]:
+    """Колонки входа, которые нужно читать: сырые колонки модели плюс target, id-колонки и колонка сегмента."""
+    return list(dict.fromkeys(required_columns(feature_preprocessor, model_columns(model)) + list(extra_columns)))
+
+
+def _init_worker(model_path, preprocessor_path, extra_columns, id_columns, threshold, segments, thread_count,
+                 with_metrics=False):
+    """Инициализатор пула: модель и препроцессор загружаются один раз на процесс."""
+    model = load_model(model_path)
+    feature_preprocessor = load_preprocessor(preprocessor_path)
+    _worker.update(
+        model=model,
+        feature_preprocessor=feature_preprocessor,
+        columns=scoring_columns(model, feature_preprocessor, extra_columns),
+        id_columns=id_columns,
+        threshold=threshold,
+        segments=segments,
+        thread_count=thread_count,
+        with_metrics=with_metrics,
+    )
+
+
+def _worker_columns() -> List[str]:
+    return _worker["columns"]
+
+
+def _score_partition(partition):
+    # Партиция — либо (путь к parquet, номер row group), либо уже прочитанный чанк
+    if isinstance(partition, tuple):
+        path, row_group = partition
+        parquet_file = pq.ParquetFile(path)
+        columns = [col for col in _worker["columns"] if col in parquet_file.schema_arrow.names]
+        partition = parquet_file.read_row_group(row_group, columns=columns).to_pandas()
+
+    result = next(score_chunks(
+        iter([partition]),
+        _worker["model"],
+        _worker["feature_preprocessor"],
+        _worker["id_columns"],
+        _worker["threshold"],
+        _worker["segments"],
+        _worker["thread_count"],
+    ))
+    return with_metrics(result, _worker["with_metrics"])
+
+
+def iter_partitions(paths: List[str], chunk_size: int, columns: List[str]) -> Iterator:
+    """
+    Партиции не больше chunk_size строк. Row group'ы Parquet, которые в это укладываются, читаются
+    в воркерах; большие row group'ы и остальные форматы режутся на чанки в главном процессе
+    (для файла из одного row group иначе была бы одна задача и никакого параллелизма).
+    """
+    for path in paths:
+        if path.endswith(".parquet") and not path.endswith(INDEX_SUFFIX):
+            parquet_file = pq.ParquetFile(path)
+            names = [col for col in columns if col in parquet_file.schema_arrow.names]
+            for row_group in range(parquet_file.num_row_groups):
+                if parquet_file.metadata.row_group(row_group).num_rows <= chunk_size:
+                    yield path, row_group
+                    continue
+                for batch in parquet_file.iter_batches(batch_size=chunk_size, row_groups=[row_group], columns=names):
+                    yield batch.to_pandas()
+        else:
+            yield from iter_chunks(path, chunk_size, columns)
+
+
+def score_parallel(paths: List[str], chunk_size: int, workers: int, initargs: tuple) -> Iterator:
+    """
+    Скорит партиции в ProcessPoolExecutor и отдаёт результаты в исходном порядке.
+    В работе одновременно не больше 2 * workers партиций, так что память ограничена.
+    Модель загружается только в воркерах: список читаемых колонок главный процесс получает от них.
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+        columns = executor.submit(_worker_columns).result()
+        pending = deque()
+        for partition in iter_partitions(paths, chunk_size, columns):
+            pending.append(executor.submit(_score_partition, partition))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def predict_streaming(
+    input_path: str,
+    output_path: str,
+    model_path: str,
+    preprocessor_path: str,
+    chunk_size: int = 100_000,
+    id_columns: Optional[List[str]] = None,
+    threshold: Optional[float] = None,
+    segment_thresholds_path: Optional[str] = None,
+    workers: int = 1,
+    metrics_path: Optional[str] = None,
+    plots_dir: Optional[str] = None,
+) -> str:
+    """
+    Потоковый скоринг: вход (файл или папка файлов) читается кусками, каждый кусок
+    предобрабатывается, скорится и дописывается в result.parquet. Память ограничена
+    размером чанка. При workers > 1 партиции скорятся параллельно в пуле процессов.
+
+    С metrics_path метрики (и графики в plots_dir) считаются по ходу скоринга —
+    без второго прохода по результату; нужен target во входных данных.
+    """
+    threshold = load_threshold(model_path) if threshold is None else threshold
+    segments = load_segment_thresholds(segment_thresholds_path) if segment_thresholds_path else None
+
+    # Помимо колонок модели читаем target, id-колонки и колонку сегмента
+    extra_columns = ["target"] + list(id_columns or [])
+    if segments is not None:
+        extra_columns.append(segments["column"])
+    paths = input_files(input_path)
+    if not paths:
+        raise FileNotFoundError(f"No dataset files in {input_path}")
+    schema = result_schema(paths, id_columns)
+
+    if workers > 1:
+        thread_count = max(1, (os.cpu_count() or 1) // workers)
+        initargs = (model_path, preprocessor_path, extra_columns, id_columns, threshold, segments, thread_count,
+                    metrics_path is not None)
+        results = score_parallel(paths, chunk_size, workers, initargs)
+    else:
+        model = load_model(model_path)
+        feature_preprocessor = load_preprocessor(preprocessor_path)
+        columns = scoring_columns(model, feature_preprocessor, extra_columns)
+        chunks = (chunk for path in paths for chunk in iter_chunks(path, chunk_size, columns))
+        results = (
+            with_metrics(result, metrics_path is not None)
+            for result in score_chunks(chunks, model, feature_preprocessor, id_columns, threshold, segments)
+        )
+
+    os.makedirs(output_path, exist_ok=True)
+    result_path = os.path.join(output_path, "result.parquet")
+
+    writer = None
+    n_rows = 0
+    metrics = MetricsAccumulator()
+    try:
+        for result, partial in results:
+            if partial is not None:
+                metrics.merge(partial)
+            if writer is None:
+                writer = pq.ParquetWriter(result_path, schema)
+            writer.write_table(to_table(result, schema))
+            n_rows += len(result)
+            print(f"📦 Обработано строк: {n_rows}")
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        # Пустой вход — пустой файл с той же схемой, а не отсутствие файла
+        pq.write_table(schema.empty_table(), result_path)
+
+    print(f"✅ Предсказания сохранены в {result_path}")
+
+    if metrics_path is not None:
+        if metrics.n_rows:
+            evaluate_accumulated(metrics, metrics_path, plots_dir, skip_plots=plots_dir is None)
+        else:
+            print("⚠️ Во входных данных нет target — метрики не посчитаны")
+    return result_path
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="📈 Генерация предсказаний с использованием обученной модели"
@@ -41,8 +318,8 @@ if __name__ == "__main__":
     parser.add_argument(
         "--test_path",
         type=str,
-        default=os.path.join("Data", "processed", "test.csv"),
-        help="📂 Путь к тестовому CSV"
+        default=os.path.join("Data", "processed", "test.feather"),
+        help="📂 Путь к тестовым данным: feather, parquet, csv, .index.parquet (в потоковом режиме — также папка)"
     )
     parser.add_argument(
         "--model_path",
@@ -50,12 +327,95 @@ if __name__ == "__main__":
         default=os.path.join("models", "catboost_model.cbm"),
         help="💾 Путь к обученной модели CatBoost"
     )
+    parser.add_argument(
+        "--preprocessor_path",
+        type=str,
+        default=os.path.join("models", "feature_preprocessor.pkl"),
+        help="💾 Путь к сохранённому препроцессору признаков"
+    )
     parser.add_argument(
         "--output_path",
         type=str,
         default=os.path.join("Data", "processed", "predictions"),
-        help="📁 Папка для сохранения result.csv"
+        help="📁 Папка для сохранения result.csv / result.parquet"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=None,
+        help="🎚️ Порог решения (по умолчанию — сохранённый рядом с моделью, иначе 0.5)"
+    )
+    parser.add_argument(
+        "--segment_thresholds",
+        type=str,
+        default=None,
+        help="🗂️ JSON с порогами по сегментам: {\"column\": ..., \"thresholds\": {значение: порог}}"
+    )
+    parser.add_argument(
+        "--feature_cache_dir",
+        type=str,
+        default=None,
+        help="🗄️ Папка кэша признаков (только непотоковый режим; по умолчанию отключён)"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="🌊 Потоковый режим: чтение и скоринг по чанкам, результат в result.parquet"
+    )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=100_000,
+        help="📏 Размер чанка (строк) в потоковом режиме"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="🧵 Число процессов для параллельного скоринга в потоковом режиме"
+    )
+    parser.add_argument(
+        "--metrics_path",
+        type=str,
+        default=None,
+        help="📊 Потоковый режим: посчитать метрики по ходу скоринга и сохранить в JSON"
+    )
+    parser.add_argument(
+        "--plots_dir",
+        type=str,
+        default=None,
+        help="📁 Потоковый режим: папка для графиков (вместе с --metrics_path)"
+    )
+    parser.add_argument(
+        "--id_columns",
+        nargs="*",
+        default=[],
+        help="🔑 Колонки, копируемые в результат (например, wallet_address)"
     )
 
     args = parser.parse_args()
-    predict(args.test_path, args.output_path, args.model_path)
+
+    if args.stream:
+        predict_streaming(
+            args.test_path,
+            args.output_path,
+            args.model_path,
+            args.preprocessor_path,
+            chunk_size=args.chunk_size,
+            id_columns=args.id_columns,
+            threshold=args.threshold,
+            segment_thresholds_path=args.segment_thresholds,
+            workers=args.workers,
+            metrics_path=args.metrics_path,
+            plots_dir=args.plots_dir,
+        )
+    else:
+        predict(
+            args.test_path,
+            args.output_path,
+            args.model_path,
+            args.preprocessor_path,
+            threshold=args.threshold,
+            segment_thresholds_path=args.segment_thresholds,
+            feature_cache_dir=args.feature_cache_dir,
+        )
@@ -2,26 +2,44 @@
 
 import os
 import argparse
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split
 
+from scripts.dataset_io import INDEX_SUFFIX, write_dataset, write_split_index
 
-def preprocess_train_test(raw_path: str, processed_path: str, save_preprocessor=True):
+# Форматы сплита: расширения файлов train/test
+SPLIT_FORMATS = {
+    "feather": ".feather",
+    "parquet": ".parquet",
+    "csv": ".csv",
+    "index": INDEX_SUFFIX,
+}
+
+
+def preprocess_train_test(raw_path: str, processed_path: str, save_preprocessor=True, fmt: str = "feather"):
     df = pd.read_parquet(raw_path)
-    X = df.drop(columns=["target"])
     y = df["target"]
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
+    # Делим номера строк: тот же сплит, что и при делении самих X, y
+    train_rows, test_rows = train_test_split(
+        np.arange(len(df)), test_size=0.2, random_state=42, stratify=y
     )
 
-    train_path = os.path.join(processed_path, "train.csv")
-    test_path = os.path.join(processed_path, "test.csv")
+    os.makedirs(processed_path, exist_ok=True)
+    suffix = SPLIT_FORMATS[fmt]
+    train_path = os.path.join(processed_path, f"train{suffix}")
+    test_path = os.path.join(processed_path, f"test{suffix}")
 
-    pd.concat([X_train, y_train], axis=1).to_csv(train_path, index=False)
-    pd.concat([X_test, y_test], axis=1).to_csv(test_path, index=False)
+    if fmt == "index":
+        # Данные не дублируются: сохраняются только номера строк исходного parquet
+        write_split_index(train_rows, raw_path, train_path)
+        write_split_index(test_rows, raw_path, test_path)
+    else:
+        write_dataset(df.iloc[train_rows], train_path)
+        write_dataset(df.iloc[test_rows], test_path)
 
-    print("✅ Тренировочный и тестовый датасеты успешно сохранены.")
+    print(f"✅ Тренировочный и тестовый датасеты успешно сохранены: {train_path}, {test_path}")
 
 
 if __name__ == "__main__":
@@ -39,7 +57,14 @@ if __name__ == "__main__":
         "--processed_path",
         type=str,
         default=os.path.join("Data", "processed"),
-        help="📁 Path to save processed train/test CSVs",
+        help="📁 Path to save processed train/test files",
+    )
+    parser.add_argument(
+        "--format",
+        type=str,
+        choices=sorted(SPLIT_FORMATS),
+        default="feather",
+        help="🗃️ Split format: feather (memory-mapped), parquet, csv or index (row index over raw parquet)",
     )
     parser.add_argument(
         "--no_save_preprocessor",
@@ -53,4 +78,5 @@ if __name__ == "__main__":
         raw_path=args.raw_path,
         processed_path=args.processed_path,
         save_preprocessor=not args.no_save_preprocessor,
+        fmt=args.format,
     )
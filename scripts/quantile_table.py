@@ -0,0 +1,114 @@
+# scripts/quantile_table.py
+
+from typing import Dict, List, Optional
+
+import numpy as np
+from scipy.special import ndtri
+
+# Те же границы, что и в sklearn.preprocessing.QuantileTransformer
+BOUNDS_THRESHOLD = 1e-7
+
+
+class QuantileTable:
+    """
+    Компактная таблица квантилей, выгруженная из обученных QuantileTransformer.
+
+    Квантили всех колонок хранятся одной матрицей (n_quantiles, n_columns) с общей
+    сеткой ``references``; преобразование повторяет QuantileTransformer.transform
+    численно один в один, но без валидации sklearn и для всех колонок сразу.
+    """
+
+    def __init__(self, columns: List[str], quantiles: np.ndarray, references: np.ndarray, output_distribution: str):
+        self.columns = list(columns)
+        self.quantiles = np.ascontiguousarray(quantiles, dtype=np.float64)
+        self.references = np.ascontiguousarray(references, dtype=np.float64)
+        self.output_distribution = output_distribution
+        self._index = {col: i for i, col in enumerate(self.columns)}
+
+    @classmethod
+    def from_transformers(cls, transformers: Dict[str, object]) -> "QuantileTable":
+        """Собирает таблицу из словаря {колонка: обученный QuantileTransformer}."""
+        columns = [col for col, qt in transformers.items() if qt is not None]
+        if not columns:
+            return cls([], np.empty((0, 0)), np.empty(0), "normal")
+
+        first = transformers[columns[0]]
+        for col in columns:
+            qt = transformers[col]
+            if qt.output_distribution != first.output_distribution or not np.array_equal(qt.references_, first.references_):
+                raise ValueError(f"Quantile transformer for '{col}' is incompatible with the shared table")
+
+        quantiles = np.column_stack([transformers[col].quantiles_[:, 0] for col in columns])
+        return cls(columns, quantiles, first.references_, first.output_distribution)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_index", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._index = {col: i for i, col in enumerate(self.columns)}
+
+    def transform(self, X: np.ndarray, columns: Optional[List[str]] = None) -> np.ndarray:
+        """Квантильное преобразование матрицы X (n, len(columns)); возвращает новый float64-массив."""
+        columns = self.columns if columns is None else columns
+        idx = [self._index[col] for col in columns]
+        X = np.array(X, dtype=np.float64, ndmin=2)
+        quantiles = self.quantiles[:, idx]
+
+        lower_x = quantiles[0]
+        upper_x = quantiles[-1]
+
+        with np.errstate(invalid="ignore"):
+            if self.output_distribution == "normal":
+                lower_idx = X - BOUNDS_THRESHOLD < lower_x
+                upper_idx = X + BOUNDS_THRESHOLD > upper_x
+            else:
+                lower_idx = X == lower_x
+                upper_idx = X == upper_x
+
+        # Интерполяция в обе стороны и среднее — как в sklearn, на случай повторяющихся квантилей
+        references = self.references
+        references_rev = -references[::-1]
+        for j in range(X.shape[1]):
+            col = X[:, j]
+            finite = ~np.isnan(col)
+            values = col[finite]
+            q = quantiles[:, j]
+            col[finite] = 0.5 * (np.interp(values, q, references) - np.interp(-values, -q[::-1], references_rev))
+
+        X[upper_idx] = 1
+        X[lower_idx] = 0
+
+        if self.output_distribution == "normal":
+            clip_min = ndtri(BOUNDS_THRESHOLD - np.spacing(1))
+            clip_max = ndtri(1 - (BOUNDS_THRESHOLD - np.spacing(1)))
+            X = np.clip(ndtri(X), clip_min, clip_max)
+
+        return X
+
+    def psi(self, X: np.ndarray, columns: Optional[List[str]] = None, n_bins: int = 10) -> Dict[str, float]:
+        """
+        Population Stability Index новых данных относительно обученных квантилей.
+
+        Границы бинов — квантили обучающей выборки уровня 1/n_bins, ..., (n_bins-1)/n_bins,
+        так что ожидаемая доля в каждом бине равна 1/n_bins.
+        """
+        columns = self.columns if columns is None else columns
+        X = np.array(X, dtype=np.float64, ndmin=2)
+        levels = np.linspace(0, 1, n_bins + 1)[1:-1]
+        expected = 1.0 / n_bins
+        result = {}
+
+        for j, col in enumerate(columns):
+            values = X[:, j][~np.isnan(X[:, j])]
+            if values.size == 0:
+                result[col] = 0.0
+                continue
+            edges = np.interp(levels, self.references, self.quantiles[:, self._index[col]])
+            counts = np.bincount(np.searchsorted(edges, values, side="right"), minlength=n_bins)
+            actual = np.clip(counts / values.size, 1e-6, None)
+            result[col] = float(np.sum((actual - expected) * np.log(actual / expected)))
+
+        return result
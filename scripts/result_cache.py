@@ -0,0 +1,211 @@
+# scripts/result_cache.py
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence
+
+# === Настройки кэша (переопределяются переменными окружения) ===
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "10000"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+# Общий бэкенд: memory:// — локальная замена для проверки, redis://host:port/db — Redis (нужен пакет redis)
+RESULT_CACHE_URL = os.getenv("RESULT_CACHE_URL", "")
+# Таймаут операций общего бэкенда: при недоступном Redis кэш пропускается, а не держит запрос
+RESULT_CACHE_TIMEOUT = float(os.getenv("RESULT_CACHE_TIMEOUT", "0.1"))
+
+
+def record_key(record: Dict[str, Any], columns: Sequence[str], version: str) -> str:
+    """
+    Стабильный ключ записи: хэш значений колонок в заданном порядке и версии модели.
+    Поля вне columns не влияют на ключ; отсутствующие колонки кодируются как null.
+    """
+    payload = json.dumps([version, [record.get(col) for col in columns]], separators=(",", ":"), default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class InMemoryKV:
+    """
+    Локальная замена общего KV-хранилища с подмножеством API redis-py (get / set с ex / flushdb).
+    Нужна для проверки общего бэкенда без внешнего сервиса.
+    """
+
+    def __init__(self):
+        self._data: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: bytes, ex: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+
+
+def shared_backend(url: str):
+    """Клиент общего бэкенда по URL: memory:// — InMemoryKV, redis:// — redis.Redis."""
+    if url.startswith("memory://"):
+        return InMemoryKV()
+    if url.startswith(("redis://", "rediss://")):
+        # Redis — необязательная зависимость, нужна только при таком URL
+        import redis
+        return redis.Redis.from_url(url, socket_timeout=RESULT_CACHE_TIMEOUT, socket_connect_timeout=RESULT_CACHE_TIMEOUT)
+    raise ValueError(f"Unsupported result cache backend: {url}")
+
+
+class ResultCache:
+    """
+    Кэш результатов предсказаний: ограниченный LRU с TTL в памяти процесса и,
+    опционально, общий бэкенд второго уровня (клиент с get/set(ex=...) как у redis-py).
+
+    Версия модели входит в ключ, поэтому после перезагрузки модели старые записи
+    общего бэкенда просто перестают находиться и истекают по TTL; локальный уровень
+    при этом очищается целиком (``invalidate``).
+
+    Ошибки общего бэкенда не пробрасываются: кэш работает как промах (fail open), ошибки
+    считаются в ``stats()``. Из async-кода используются ``aget``/``aput`` — сетевой
+    ввод-вывод бэкенда выполняется в пуле потоков, а не в event loop.
+    """
+
+    def __init__(self, max_size: int = RESULT_CACHE_SIZE, ttl: float = RESULT_CACHE_TTL, backend=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.backend = backend
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._shared_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+        self._backend_errors = 0
+        self._backend_last_error = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def _get_local(self, key: str, now: float):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires_at = item
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self._hits += 1
+                    return True, value
+                del self._data[key]
+        return False, None
+
+    def _get_shared(self, key: str, now: float):
+        try:
+            raw = self.backend.get(key)
+            if raw is None:
+                return False, None
+            value = json.loads(raw)
+        except Exception as e:
+            self._backend_error(e)
+            return False, None
+        self._store(key, value, now)
+        with self._lock:
+            self._shared_hits += 1
+        return True, value
+
+    def _put_shared(self, key: str, value: Any):
+        try:
+            self.backend.set(key, json.dumps(value), ex=self.ttl)
+        except Exception as e:
+            self._backend_error(e)
+
+    def _backend_error(self, error: Exception):
+        with self._lock:
+            self._backend_errors += 1
+            self._backend_last_error = f"{type(error).__name__}: {error}"
+
+    def _miss(self, default):
+        with self._lock:
+            self._misses += 1
+        return default
+
+    def get(self, key: str, default=None):
+        """Значение по ключу: сначала локальный LRU, затем общий бэкенд."""
+        now = time.monotonic()
+        found, value = self._get_local(key, now)
+        if not found and self.backend is not None:
+            found, value = self._get_shared(key, now)
+        return value if found else self._miss(default)
+
+    async def aget(self, key: str, default=None):
+        """Как ``get``, но запрос к общему бэкенду выполняется в пуле потоков."""
+        now = time.monotonic()
+        found, value = self._get_local(key, now)
+        if not found and self.backend is not None:
+            found, value = await asyncio.get_running_loop().run_in_executor(None, self._get_shared, key, now)
+        return value if found else self._miss(default)
+
+    def put(self, key: str, value: Any):
+        """Сохраняет JSON-совместимое значение на обоих уровнях."""
+        self._store(key, value, time.monotonic())
+        if self.backend is not None:
+            self._put_shared(key, value)
+
+    async def aput(self, key: str, value: Any):
+        """Как ``put``, но запись в общий бэкенд выполняется в пуле потоков."""
+        self._store(key, value, time.monotonic())
+        if self.backend is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._put_shared, key, value)
+
+    def _store(self, key: str, value: Any, now: float):
+        with self._lock:
+            self._data[key] = (value, now + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self):
+        """Очищает локальный уровень (вызывается при перезагрузке модели в реестре)."""
+        with self._lock:
+            self._data.clear()
+            self._invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self._hits + self._shared_hits
+            total = hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_sec": self.ttl,
+                "shared_backend": type(self.backend).__name__ if self.backend is not None else None,
+                "hits": self._hits,
+                "shared_hits": self._shared_hits,
+                "misses": self._misses,
+                "hit_rate": hits / total if total else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "backend_errors": self._backend_errors,
+                "backend_last_error": self._backend_last_error,
+            }
+
+
+# === Общий кэш процесса ===
+result_cache = ResultCache(
+    RESULT_CACHE_SIZE, RESULT_CACHE_TTL, shared_backend(RESULT_CACHE_URL) if RESULT_CACHE_URL else None
+)
@@ -0,0 +1,197 @@
+# scripts/serve.py
+
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import argparse
+import traceback
+import subprocess
+
+# === Перезапуск упавших воркеров ===
+# Воркер, упавший с ненулевым кодом, перезапускается с экспоненциальной задержкой; после
+# MAX_RESTARTS падений подряд (каждое раньше STABLE_UPTIME_SEC после старта) слот не перезапускается
+RESTART_BACKOFF_SEC = float(os.getenv("RESTART_BACKOFF_SEC", "1"))
+RESTART_BACKOFF_MAX_SEC = float(os.getenv("RESTART_BACKOFF_MAX_SEC", "30"))
+MAX_RESTARTS = int(os.getenv("MAX_RESTARTS", "5"))
+STABLE_UPTIME_SEC = float(os.getenv("STABLE_UPTIME_SEC", "30"))
+# Код выхода uvicorn при ошибке старта (lifespan startup)
+STARTUP_FAILURE = 3
+
+
+def import_profile(top: int = 20) -> list:
+    """Самые дорогие (кумулятивно) импорты app.main по ``python -X importtime``: [(мкс, модуль)]."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    """Слушающий сокет мастера; воркеры наследуют его при fork и принимают соединения из общей очереди."""
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, log_level: str):
+    import uvicorn
+    from app.main import app
+
+    config = uvicorn.Config(app, log_level=log_level, lifespan="on")
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+    # Как в uvicorn.run: сервер, не сумевший стартовать, завершается с ошибкой
+    if not server.started:
+        sys.exit(STARTUP_FAILURE)
+
+
+def worker_main(sock: socket.socket, log_level: str):
+    """Тело форкнутого воркера: код выхода отражает результат, исключение — ненулевой код."""
+    code = 1
+    try:
+        run_worker(sock, log_level)
+        code = 0
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+def restart_delay(failures: int) -> float:
+    """Экспоненциальная задержка перед перезапуском после failures падений подряд."""
+    return min(RESTART_BACKOFF_MAX_SEC, RESTART_BACKOFF_SEC * 2 ** (failures - 1))
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000, workers: int = 1, log_level: str = "info") -> int:
+    """
+    Pre-fork сервер: мастер один раз импортирует приложение и загружает модель с препроцессором
+    в реестр, затем форкает воркеров uvicorn на общем сокете. Воркеры не тратят время на импорт
+    и загрузку, а память модели делится между ними copy-on-write.
+
+    Возвращает код выхода: 1, если хотя бы один слот остановлен после MAX_RESTARTS падений подряд.
+    """
+    # 1. Импорт приложения и всех тяжёлых библиотек — один раз в мастере
+    start = time.perf_counter()
+    import app.main as main
+    import_seconds = time.perf_counter() - start
+
+    # 2. Загрузка модели и препроцессора (без предсказаний: пулы потоков CatBoost создаются уже в воркерах)
+    start = time.perf_counter()
+    main.warmup()
+    load_seconds = time.perf_counter() - start
+    main.STARTUP.update(import_seconds=import_seconds, load_seconds=load_seconds, preforked=True)
+    print(f"🚀 Импорт: {import_seconds:.2f} с, загрузка модели: {load_seconds:.2f} с; воркеров: {workers}")
+
+    # 3. Всё, что создал мастер, — в permanent generation: GC воркеров не обходит эти объекты
+    # и не копирует их страницы при записи в заголовки
+    gc.collect()
+    gc.freeze()
+
+    sock = bind_socket(host, port)
+    children = {}
+    failures = {}
+    stopping = False
+    exit_code = 0
+
+    def spawn(slot: int):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            worker_main(sock, log_level)
+        children[pid] = (slot, time.monotonic())
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for slot in range(workers):
+        spawn(slot)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # 4. Мастер ждёт воркеров и перезапускает упавших (уже без импорта и загрузки модели)
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        entry = children.pop(pid, None)
+        if entry is None or stopping:
+            continue
+        slot, started_at = entry
+        code = os.waitstatus_to_exitcode(status)
+
+        if code == 0:
+            failures[slot] = 0
+            print(f"⚠️ Воркер {pid} завершился, перезапуск")
+            spawn(slot)
+            continue
+
+        # Падение после долгой стабильной работы не копится с прошлыми
+        if time.monotonic() - started_at >= STABLE_UPTIME_SEC:
+            failures[slot] = 0
+        failures[slot] = failures.get(slot, 0) + 1
+        if failures[slot] > MAX_RESTARTS:
+            print(f"❌ Воркер слота {slot} упал {MAX_RESTARTS + 1} раз подряд (код {code}) — больше не перезапускается")
+            exit_code = 1
+            continue
+
+        delay = restart_delay(failures[slot])
+        print(f"⚠️ Воркер {pid} упал (код {code}), перезапуск через {delay:.1f} с")
+        deadline = time.monotonic() + delay
+        while not stopping and time.monotonic() < deadline:
+            time.sleep(0.1)
+        if not stopping:
+            spawn(slot)
+
+    sock.close()
+    print("✅ Сервер остановлен" if not exit_code else "❌ Сервер остановлен: воркеры не запускаются")
+    return exit_code
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="🚀 Pre-fork запуск сервиса с общей моделью")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="🌐 Хост")
+    parser.add_argument("--port", type=int, default=8000, help="🔌 Порт")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("WEB_CONCURRENCY", "1")),
+        help="🧵 Число воркеров uvicorn (по умолчанию WEB_CONCURRENCY или 1)",
+    )
+    parser.add_argument("--log_level", type=str, default="info", help="📝 Уровень логов uvicorn")
+    parser.add_argument(
+        "--import_report",
+        action="store_true",
+        help="⏱️ Только показать самые медленные импорты app.main и выйти",
+    )
+    args = parser.parse_args()
+
+    if args.import_report:
+        for microseconds, module in import_profile():
+            print(f"{microseconds / 1000:9.1f} мс  {module}")
+    else:
+        sys.exit(serve(args.host, args.port, args.workers, args.log_level))
@@ -0,0 +1,100 @@
+# scripts/synthetic_data.py
+
+import os
+import argparse
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+from catboost import CatBoostClassifier, Pool
+
+from scripts.data_preprocessing import DataPreprocessor, FeaturePreprocessor
+from scripts.dataset_io import write_dataset
+
+# Границы unix-времени для синтетических timestamp-колонок: 2020-01-01 .. 2024-01-01
+TIMESTAMP_RANGE = (1577836800, 1704067200)
+
+
+def synthetic_columns() -> list:
+    """Колонки модели плюс все timestamp-колонки препроцессора (без дублей, в стабильном порядке)."""
+    return list(dict.fromkeys(DataPreprocessor.COLUMNS + FeaturePreprocessor().timestamp_columns))
+
+
+def _column(name: str, n: int, rng: np.random.Generator) -> np.ndarray:
+    """Правдоподобные значения по имени колонки: распределение важно только для ветвлений препроцессора/модели."""
+    if name.endswith("_timestamp"):
+        return rng.integers(*TIMESTAMP_RANGE, n).astype(np.float64)
+    if name.endswith("_count"):
+        return rng.poisson(5, n).astype(np.int64)
+    if name == "borrow_block_number":
+        return rng.integers(9_000_000, 19_000_000, n)
+    if name.startswith("market_"):
+        return rng.normal(0, 50, n)
+    if "risk_factor" in name:
+        return rng.beta(2, 5, n)
+    if name.startswith("time_since") or name == "wallet_age" or name.endswith("_diff"):
+        return rng.exponential(3e7, n)
+    # *_eth и прочие суммы: тяжёлый правый хвост
+    return rng.lognormal(1, 2, n)
+
+
+def synthetic_records(n: int, seed: int = 0, with_target: bool = False) -> pd.DataFrame:
+    """n синтетических записей со всеми колонками, нужными DataPreprocessor и FeaturePreprocessor."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({name: _column(name, n, rng) for name in synthetic_columns()})
+    df["wallet_address"] = [f"0x{i:040x}" for i in range(n)]
+    if with_target:
+        logit = 4 * (df["risk_factor"] - 0.3) + rng.normal(0, 1, n)
+        df["target"] = (logit > 0).astype(np.int64)
+    return df
+
+
+def train_synthetic_model(output_dir: str, n: int = 20_000, iterations: int = 200, depth: int = 8,
+                          seed: int = 0) -> Tuple[str, str]:
+    """
+    Обучает небольшую модель на синтетике (те же колонки и препроцессор, что и у боевой)
+    для бенчмарков на машинах без артефактов. Возвращает пути (модель, препроцессор).
+    """
+    df = synthetic_records(n, seed=seed, with_target=True)
+    X, y = df.drop(columns=["target"]), df["target"]
+
+    feature_preprocessor = FeaturePreprocessor().fit(X)
+    X_processed = DataPreprocessor().data_preprocessing(X, feature_preprocessor)
+
+    model = CatBoostClassifier(iterations=iterations, depth=depth, random_seed=seed, verbose=False,
+                               allow_writing_files=False)
+    model.fit(Pool(X_processed, y))
+
+    os.makedirs(output_dir, exist_ok=True)
+    model_path = os.path.join(output_dir, "catboost_model.cbm")
+    preprocessor_path = os.path.join(output_dir, "feature_preprocessor.pkl")
+    model.save_model(model_path)
+    feature_preprocessor.save(preprocessor_path)
+    return model_path, preprocessor_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="🧪 Генерация синтетических записей")
+    parser.add_argument("--n_rows", type=int, default=100_000, help="📏 Число строк")
+    parser.add_argument("--seed", type=int, default=0, help="🎲 Seed генератора")
+    parser.add_argument("--with_target", action="store_true", help="🎯 Добавить колонку target")
+    parser.add_argument(
+        "--output_path",
+        type=str,
+        default=os.path.join("Data", "synthetic.parquet"),
+        help="💾 Куда сохранить (feather, parquet или csv)",
+    )
+    parser.add_argument(
+        "--model_dir",
+        type=str,
+        default=None,
+        help="🤖 Дополнительно обучить синтетическую модель и сохранить в эту папку",
+    )
+    args = parser.parse_args()
+
+    write_dataset(synthetic_records(args.n_rows, args.seed, args.with_target), args.output_path)
+    print(f"✅ Синтетические данные сохранены в {args.output_path}")
+
+    if args.model_dir:
+        model_path, preprocessor_path = train_synthetic_model(args.model_dir, seed=args.seed)
+        print(f"✅ Синтетическая модель: {model_path}, {preprocessor_path}")
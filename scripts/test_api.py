@@ -1,14 +1,28 @@
 # scripts/test_api.py
 
 import os
+import sys
 import json
-import requests
+import time
+import asyncio
+import argparse
+import itertools
+import subprocess
+from collections import Counter
+
+import httpx
+import numpy as np
 
 # === 1. Настройки ===
 TEST_CASES_DIR = os.path.join(os.path.dirname(__file__), "..", "Data", "Test Cases")
-URL = "http://127.0.0.1:8000/predict"
+BASE_URL = os.getenv("API_URL", "http://127.0.0.1:8000")
+URL = BASE_URL + "/predict"
+
+# Границы корзин гистограммы задержек, мс
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
 
-# === 2. Функция для отправки тестов ===
+
+# === 2. Smoke-тест: каждый тест-кейс отправляется один раз ===
 def send_test_cases():
     test_files = [f for f in os.listdir(TEST_CASES_DIR) if f.endswith(".json")]
 
@@ -16,18 +30,212 @@ def send_test_cases():
         print("⚠️  В папке 'Test Cases' нет JSON-файлов.")
         return
 
-    for filename in test_files:
-        file_path = os.path.join(TEST_CASES_DIR, filename)
-        print(f"\n📤 Отправка файла: {filename}")
+    with httpx.Client() as client:
+        for filename in test_files:
+            file_path = os.path.join(TEST_CASES_DIR, filename)
+            print(f"\n📤 Отправка файла: {filename}")
+            try:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)[0]
+
+                response = client.post(URL, json=data)
+                print(f"✅ Ответ сервиса ({response.status_code}): {response.json()}")
+            except Exception as e:
+                print(f"❌ Ошибка при обработке {filename}: {e}")
+
+
+# === 3. Источники записей для нагрузки ===
+def load_records(source: str, n_records: int = 1000) -> list:
+    """Записи из Data/Test Cases или синтетические (scripts.synthetic_data)."""
+    if source == "test_cases":
+        records = []
+        for filename in sorted(os.listdir(TEST_CASES_DIR)):
+            if filename.endswith(".json"):
+                with open(os.path.join(TEST_CASES_DIR, filename), "r", encoding="utf-8") as f:
+                    records.extend(json.load(f))
+        if not records:
+            raise FileNotFoundError(f"No JSON test cases in {TEST_CASES_DIR}")
+        return records
+
+    # Генератор тянет catboost/sklearn — импортируем только при выборе синтетики
+    from scripts.synthetic_data import synthetic_records
+    # Через to_json, чтобы в записях были только JSON-совместимые типы
+    return json.loads(synthetic_records(n_records).to_json(orient="records"))
+
+
+# === 4. Статистика ===
+class LoadStats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = Counter()
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def ok(self, latency: float):
+        self.latencies.append(latency)
+
+    def error(self, kind: str):
+        self.errors[kind] += 1
+
+    def report(self) -> dict:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        latencies_ms = np.array(self.latencies) * 1000
+        n_errors = sum(self.errors.values())
+        total = len(self.latencies) + n_errors
+
+        report = {
+            "requests": total,
+            "duration_s": elapsed,
+            "throughput_rps": len(self.latencies) / elapsed if elapsed else 0.0,
+            "error_rate": n_errors / total if total else 0.0,
+            "errors": dict(self.errors),
+        }
+        if latencies_ms.size:
+            p50, p90, p99, p999 = np.percentile(latencies_ms, [50, 90, 99, 99.9])
+            report.update(
+                latency_ms={"mean": latencies_ms.mean(), "p50": p50, "p90": p90, "p99": p99,
+                            "p99.9": p999, "max": latencies_ms.max()},
+                histogram_ms=dict(zip(
+                    [f"<={bucket}" for bucket in HISTOGRAM_BUCKETS_MS] + [f">{HISTOGRAM_BUCKETS_MS[-1]}"],
+                    np.bincount(np.searchsorted(HISTOGRAM_BUCKETS_MS, latencies_ms),
+                                minlength=len(HISTOGRAM_BUCKETS_MS) + 1).tolist(),
+                )),
+            )
+        return report
+
+
+def print_report(report: dict):
+    print(f"\n📊 Запросов: {report['requests']} за {report['duration_s']:.1f} с, "
+          f"{report['throughput_rps']:.1f} RPS, ошибок: {report['error_rate']:.2%}")
+    for kind, count in report["errors"].items():
+        print(f"   ❌ {kind}: {count}")
+    if "latency_ms" in report:
+        latency = report["latency_ms"]
+        print("⏱️  " + ", ".join(f"{name}={value:.2f} мс" for name, value in latency.items()))
+        peak = max(report["histogram_ms"].values()) or 1
+        for bucket, count in report["histogram_ms"].items():
+            print(f"   {bucket:>7} мс | {'█' * round(40 * count / peak):<40} {count}")
+
+
+# === 5. Генераторы нагрузки ===
+async def _send(client: httpx.AsyncClient, url: str, record: dict, stats: LoadStats, start: float):
+    try:
+        response = await client.post(url, json=record)
+    except httpx.HTTPError as e:
+        stats.error(type(e).__name__)
+        return
+    if response.status_code == 200:
+        stats.ok(time.perf_counter() - start)
+    else:
+        stats.error(f"HTTP {response.status_code}")
+
+
+async def closed_loop(client, url: str, records: list, stats: LoadStats, concurrency: int, duration: float):
+    """Closed loop: concurrency клиентов, каждый шлёт следующий запрос сразу после ответа."""
+    deadline = time.perf_counter() + duration
+    source = itertools.cycle(records)
+
+    async def user():
+        while time.perf_counter() < deadline:
+            await _send(client, url, next(source), stats, time.perf_counter())
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+
+
+async def open_loop(client, url: str, records: list, stats: LoadStats, rate: float, duration: float):
+    """
+    Open loop: запросы уходят с фиксированной частотой rate независимо от ответов.
+    Задержка считается от запланированного момента отправки, чтобы очередь на клиенте
+    не скрывала деградацию сервиса (coordinated omission).
+    """
+    start = time.perf_counter()
+    tasks = []
+    for i, record in enumerate(itertools.cycle(records)):
+        scheduled = start + i / rate
+        if scheduled - start >= duration:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(_send(client, url, record, stats, scheduled)))
+    await asyncio.gather(*tasks)
+
+
+async def run_load(url: str, records: list, mode: str = "closed", concurrency: int = 32, rate: float = 100.0,
+                   duration: float = 10.0, timeout: float = 5.0) -> dict:
+    """Нагрузка через один пул соединений (keep-alive) на concurrency соединений."""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    stats = LoadStats()
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        stats.started = time.perf_counter()
+        if mode == "closed":
+            await closed_loop(client, url, records, stats, concurrency, duration)
+        else:
+            await open_loop(client, url, records, stats, rate, duration)
+        stats.finished = time.perf_counter()
+    return stats.report()
+
+
+# === 6. Локальный сервер ===
+def start_server(host: str, port: int, timeout: float = 60.0) -> subprocess.Popen:
+    """Поднимает uvicorn с app.main:app и ждёт, пока сервис начнёт отвечать (после прогрева модели)."""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", host, "--port", str(port), "--log-level", "warning"]
+    )
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with code {process.returncode}")
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)[0]
+            httpx.get(f"http://{host}:{port}/openapi.json", timeout=1.0)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise TimeoutError(f"uvicorn did not start within {timeout} s")
 
-            response = requests.post(URL, json=data)
-            print(f"✅ Ответ сервиса ({response.status_code}): {response.json()}")
-        except Exception as e:
-            print(f"❌ Ошибка при обработке {filename}: {e}")
 
-# === 3. Точка входа ===
+# === 7. Точка входа ===
 if __name__ == "__main__":
-    send_test_cases()
+    parser = argparse.ArgumentParser(description="🧪 Smoke-тест и нагрузочное тестирование API")
+    parser.add_argument(
+        "--mode",
+        choices=["smoke", "closed", "open"],
+        default="smoke",
+        help="🔀 smoke — по разу каждый тест-кейс; closed — фиксированная конкурентность; open — фиксированный RPS",
+    )
+    parser.add_argument("--source", choices=["test_cases", "synthetic"], default="test_cases", help="📂 Источник записей")
+    parser.add_argument("--n_records", type=int, default=1000, help="📏 Число синтетических записей")
+    parser.add_argument("--concurrency", type=int, default=32, help="🧵 Параллельных запросов / соединений")
+    parser.add_argument("--rate", type=float, default=100.0, help="🚦 Запросов в секунду (open loop)")
+    parser.add_argument("--duration", type=float, default=10.0, help="⏲️ Длительность нагрузки, с")
+    parser.add_argument("--timeout", type=float, default=5.0, help="⌛ Таймаут запроса, с")
+    parser.add_argument("--start_server", action="store_true", help="🚀 Поднять локальный uvicorn на время теста")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="🌐 Хост локального сервера")
+    parser.add_argument("--port", type=int, default=8000, help="🔌 Порт локального сервера")
+    parser.add_argument("--output_path", type=str, default=None, help="💾 Сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    if args.start_server:
+        BASE_URL = f"http://{args.host}:{args.port}"
+        URL = BASE_URL + "/predict"
+        server = start_server(args.host, args.port)
+    else:
+        server = None
+
+    try:
+        if args.mode == "smoke":
+            send_test_cases()
+        else:
+            records = load_records(args.source, args.n_records)
+            report = asyncio.run(run_load(
+                URL, records, args.mode, args.concurrency, args.rate, args.duration, args.timeout
+            ))
+            print_report(report)
+            if args.output_path:
+                with open(args.output_path, "w", encoding="utf-8") as f:
+                    json.dump(report, f, indent=4, default=float)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
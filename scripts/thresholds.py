@@ -0,0 +1,77 @@
+# scripts/thresholds.py
+
+import os
+import json
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from scripts.model_registry import save_atomic
+
+# Порог CatBoost по умолчанию: класс 1, если вероятность строго больше 0.5
+DEFAULT_THRESHOLD = 0.5
+
+
+def threshold_path(model_path: str) -> str:
+    """Файл порога лежит рядом с моделью: models/catboost_model.cbm -> models/catboost_model.threshold.json."""
+    return os.path.splitext(model_path)[0] + ".threshold.json"
+
+
+def load_threshold(model_path: str) -> float:
+    """Порог решения для модели (DEFAULT_THRESHOLD, если файл порога не сохранён)."""
+    path = threshold_path(model_path)
+    if not os.path.exists(path):
+        return DEFAULT_THRESHOLD
+    with open(path, "r", encoding="utf-8") as f:
+        return float(json.load(f)["threshold"])
+
+
+def save_threshold(model_path: str, threshold: float):
+    os.makedirs(os.path.dirname(model_path) or ".", exist_ok=True)
+    def write(path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"threshold": float(threshold)}, f, indent=4)
+
+    # Порог читается сервисом через реестр — запись атомарная
+    save_atomic(threshold_path(model_path), write)
+
+
+def best_f1_threshold(sweep: dict) -> float:
+    """Порог с максимальным F1 на сетке BinaryCurve.sweep."""
+    return float(sweep["threshold"][int(np.argmax(sweep["f1"]))])
+
+
+def load_segment_thresholds(path: str) -> dict:
+    """
+    Таблица порогов по сегментам, JSON вида
+    {"column": "unique_borrow_protocol_count", "thresholds": {"1": 0.45, "2": 0.6}}.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        table = json.load(f)
+    if "column" not in table or "thresholds" not in table:
+        raise ValueError(f"Segment threshold table {path} must contain 'column' and 'thresholds'")
+    return table
+
+
+def apply_threshold(
+    y_proba: np.ndarray,
+    threshold: float = DEFAULT_THRESHOLD,
+    segments: Optional[dict] = None,
+    segment_values: Optional[pd.Series] = None,
+) -> np.ndarray:
+    """Метки классов из вероятностей; для сегментов из таблицы используется их собственный порог."""
+    y_proba = np.asarray(y_proba)
+    thresholds = np.full(len(y_proba), threshold, dtype=np.float64)
+
+    if segments is not None:
+        values = pd.Series(segment_values).reset_index(drop=True)
+        if pd.api.types.is_numeric_dtype(values):
+            # Ключи JSON — строки; для числовых колонок "1" и 1.0 должны совпадать
+            table = {float(key): float(value) for key, value in segments["thresholds"].items()}
+        else:
+            values = values.astype(str)
+            table = {str(key): float(value) for key, value in segments["thresholds"].items()}
+        thresholds = values.map(table).fillna(threshold).to_numpy(dtype=np.float64)
+
+    return (y_proba > thresholds).astype(np.int64)
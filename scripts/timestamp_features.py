@@ -0,0 +1,104 @@
+# scripts/timestamp_features.py
+
+from typing import Iterable, List, Sequence
+
+import numpy as np
+
+# Порядок признаков совпадает с порядком, в котором их исторически строил FeaturePreprocessor.transform
+TS_FEATURE_ORDER = ('day', 'dayofweek', 'dayofyear', 'week', 'hour', 'minute', 'second', 'hour_sin', 'hour_cos')
+
+SECONDS_PER_DAY = 86400
+_DATE_FEATURES = {'day', 'dayofyear', 'week'}
+
+
+def ordered_features(features: Iterable[str]) -> List[str]:
+    """Признаки колонки в каноническом порядке."""
+    features = set(features)
+    return [name for name in TS_FEATURE_ORDER if name in features]
+
+
+def _days_from_civil(year: np.ndarray, month: int, day: int) -> np.ndarray:
+    """Номер дня от 1970-01-01 для даты григорианского календаря (алгоритм Howard Hinnant)."""
+    year = year - (month <= 2)
+    era = year // 400
+    yoe = year - era * 400
+    mp = month + 9 if month <= 2 else month - 3
+    doy = (153 * mp + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def _civil_from_days(days: np.ndarray):
+    """Год, месяц и день месяца по номеру дня от 1970-01-01."""
+    z = days + 719468
+    era = z // 146097
+    doe = z - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = np.where(mp < 10, mp + 3, mp - 9)
+    year = yoe + era * 400 + (month <= 2)
+    return year, month, day
+
+
+def _iso_weeks_in_year(year: np.ndarray) -> np.ndarray:
+    def p(y):
+        return (y + y // 4 - y // 100 + y // 400) % 7
+
+    return 52 + ((p(year) == 4) | (p(year - 1) == 3))
+
+
+def fill_timestamp_features(values: np.ndarray, features: Sequence[str], out: np.ndarray):
+    """
+    Считает календарные признаки из unix-времени (секунды) целочисленной арифметикой.
+
+    ``features`` — имена признаков из TS_FEATURE_ORDER, ``out`` — предвыделенный
+    float-массив формы (n, len(features)), заполняется на месте. Пропуски во входе
+    дают NaN, как и pd.to_datetime(..., unit='s').dt.*.
+    """
+    values = np.asarray(values)
+
+    if values.dtype.kind in 'iu':
+        valid = None
+        secs = values.astype(np.int64, copy=False)
+    else:
+        values = values.astype(np.float64, copy=False)
+        valid = np.isfinite(values)
+        secs = np.floor(np.where(valid, values, 0.0)).astype(np.int64)
+
+    days = secs // SECONDS_PER_DAY
+    sod = secs - days * SECONDS_PER_DAY
+    hour = sod // 3600
+
+    if _DATE_FEATURES.intersection(features):
+        year, _, day = _civil_from_days(days)
+        dayofyear = days - _days_from_civil(year, 1, 1) + 1
+    dayofweek = (days + 3) % 7  # 1970-01-01 — четверг, понедельник = 0
+
+    for j, name in enumerate(features):
+        if name == 'day':
+            out[:, j] = day
+        elif name == 'dayofweek':
+            out[:, j] = dayofweek
+        elif name == 'dayofyear':
+            out[:, j] = dayofyear
+        elif name == 'week':
+            week = (dayofyear - dayofweek + 9) // 7
+            week = np.where(week > _iso_weeks_in_year(year), 1, week)
+            out[:, j] = np.where(week < 1, _iso_weeks_in_year(year - 1), week)
+        elif name == 'hour':
+            out[:, j] = hour
+        elif name == 'minute':
+            out[:, j] = (sod % 3600) // 60
+        elif name == 'second':
+            out[:, j] = sod % 60
+        elif name == 'hour_sin':
+            out[:, j] = np.sin(2 * np.pi * hour.astype(np.float64) / 24)
+        elif name == 'hour_cos':
+            out[:, j] = np.cos(2 * np.pi * hour.astype(np.float64) / 24)
+        else:
+            raise ValueError(f"Unknown timestamp feature: {name}")
+
+    if valid is not None and not valid.all():
+        out[~valid] = np.nan
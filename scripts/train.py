@@ -2,11 +2,166 @@
 
 import os
 import json
+import time
+import hashlib
 import argparse
+from datetime import datetime, timezone
+
+import numpy as np
 import pandas as pd
 from catboost import CatBoostClassifier, Pool
 
+from scripts.compact_preprocessor import compact_path, save_compact
+from scripts.curves import BinaryCurve
 from scripts.data_preprocessing import FeaturePreprocessor, DataPreprocessor
+from scripts.dataset_io import read_dataset
+from scripts.feature_store import FeatureStore, dataset_fingerprint
+from scripts.model_inference import model_columns
+from scripts.model_registry import file_sha256, save_atomic
+from scripts.thresholds import DEFAULT_THRESHOLD, best_f1_threshold, load_threshold, save_threshold
+
+# === Гиперпараметры модели ===
+BASE_PARAMS = dict(
+    eval_metric="F1",
+    loss_function="Logloss",
+    random_seed=42,
+    early_stopping_rounds=30,
+    verbose=False,
+    allow_writing_files=False,
+    learning_rate=0.151,
+    l2_leaf_reg=7.8457,
+    bagging_temperature=0.0443,
+    random_strength=1.4266,
+)
+
+# Профили обучения: gpu — исходные настройки, cpu — для сборочных машин без GPU
+TRAINING_PROFILES = {
+    "gpu": dict(iterations=1000, task_type="GPU", depth=14, border_count=32),
+    "cpu": dict(iterations=2000, task_type="CPU", depth=8),
+}
+
+QUANTIZATION_BORDER_COUNT = 32
+
+# Дообучение: сколько деревьев добавить и при каком PSI колонка считается сдвинувшейся
+INCREMENTAL_ITERATIONS = 200
+SHIFT_PSI_THRESHOLD = 0.2
+
+
+def available_cpus() -> int:
+    """Число ядер, доступных процессу (с учётом cgroup/affinity, где это поддерживается)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def model_params(profile: str, **overrides) -> dict:
+    params = dict(BASE_PARAMS, **TRAINING_PROFILES[profile])
+    if profile == "cpu":
+        params["thread_count"] = available_cpus()
+    params.update(overrides)
+    return params
+
+
+def quantized_pool_paths(cache_dir: str, key: str):
+    return (
+        os.path.join(cache_dir, f"{key}.train.qpool"),
+        os.path.join(cache_dir, f"{key}.eval.qpool"),
+    )
+
+
+def build_quantized_pools(X_train, y_train, X_test, y_test, cache_dir: str, key: str,
+                          border_count: int = QUANTIZATION_BORDER_COUNT, thread_count: int = -1):
+    """
+    Квантует train один раз (border_count), eval — по тем же границам, и сохраняет оба пула на диск.
+    Если пулы с таким ключом уже есть в кэше, ничего не пересчитывается. Возвращает пути к пулам.
+    """
+    train_pool_path, eval_pool_path = quantized_pool_paths(cache_dir, key)
+    if os.path.exists(train_pool_path) and os.path.exists(eval_pool_path):
+        print(f"♻️  Квантованные пулы из кэша: {key[:12]}")
+        return train_pool_path, eval_pool_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    borders_path = os.path.join(cache_dir, f"{key}.borders.tsv")
+
+    train_pool = Pool(X_train, y_train, thread_count=thread_count)
+    train_pool.quantize(border_count=border_count)
+    train_pool.save_quantization_borders(borders_path)
+
+    eval_pool = Pool(X_test, y_test, thread_count=thread_count)
+    eval_pool.quantize(input_borders=borders_path)
+
+    train_pool.save(train_pool_path)
+    eval_pool.save(eval_pool_path)
+    return train_pool_path, eval_pool_path
+
+
+def load_quantized_pool(path: str) -> Pool:
+    return Pool("quantized://" + path)
+
+
+def data_fingerprints(train_path: str, test_path: str, cache_dir=None):
+    """
+    Отпечатки train/test — один раз за запуск, дальше они передаются в кэши и lineage.
+    С cache_dir хэши берутся из кэша FeatureStore и пересчитываются, только если изменились размер или mtime.
+    """
+    if cache_dir:
+        store = FeatureStore(cache_dir)
+        return store.dataset_fingerprint(train_path), store.dataset_fingerprint(test_path)
+    return dataset_fingerprint(train_path), dataset_fingerprint(test_path)
+
+
+def pool_cache_key(train_fingerprint: str, test_fingerprint: str, feature_preprocessor: FeaturePreprocessor,
+                   columns, border_count: int = QUANTIZATION_BORDER_COUNT) -> str:
+    payload = {
+        "train": train_fingerprint,
+        "test": test_fingerprint,
+        "preprocessor": feature_preprocessor.fingerprint(),
+        "columns": list(columns),
+        "border_count": border_count,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def lineage_path(model_path: str) -> str:
+    """Файл происхождения лежит рядом с моделью: models/catboost_model.cbm -> models/catboost_model.lineage.json."""
+    return os.path.splitext(model_path)[0] + ".lineage.json"
+
+
+def load_lineage(model_path: str) -> list:
+    path = lineage_path(model_path)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["history"]
+
+
+def write_lineage(model_path: str, record: dict, history: list):
+    """Сохраняет историю модели: записи всех предков плюс запись о текущем обучении."""
+    record = dict(record, model_sha256=file_sha256(model_path), created_at=datetime.now(timezone.utc).isoformat())
+    with open(lineage_path(model_path), "w", encoding="utf-8") as f:
+        json.dump({"history": history + [record]}, f, indent=4, ensure_ascii=False)
+
+
+def decide_threshold(model: CatBoostClassifier, X_eval: pd.DataFrame, y_eval, threshold=None,
+                     tune_threshold=False, default=DEFAULT_THRESHOLD) -> float:
+    """Порог решения новой модели: заданный явно, подобранный по лучшему F1 на eval или default."""
+    if threshold is not None:
+        return float(threshold)
+    if not tune_threshold:
+        return default
+    y_proba = model.predict_proba(X_eval)[:, 1]
+    return best_f1_threshold(BinaryCurve.from_scores(np.asarray(y_eval).astype(int), y_proba).sweep())
+
+
+def trained_iterations(model: CatBoostClassifier) -> int:
+    """
+    Число выполненных итераций по истории первой записанной метрики. В истории может не быть
+    learn/Logloss (GPU, use_best_model пишет только validation) — тогда берётся число деревьев.
+    """
+    for history in model.get_evals_result().values():
+        for values in history.values():
+            return len(values)
+    return model.tree_count_
 
 
 def save_sample_json(df_sample: pd.DataFrame, filepath: str):
@@ -16,10 +171,46 @@ def save_sample_json(df_sample: pd.DataFrame, filepath: str):
         json.dump(records, f, indent=2, ensure_ascii=False)
 
 
-def train_model(train_path, test_path, model_path, preprocessor_path):
+def prepare_features(train: pd.DataFrame, test: pd.DataFrame, train_path: str, test_path: str,
+                     feature_cache_dir=None, fingerprints=(None, None)):
+    """Обучает FeaturePreprocessor на train и строит признаки для train/test (с кэшем, если он задан)."""
+    X_train = train.drop(columns=["target"])
+    y_train = train["target"]
+    X_test = test.drop(columns=["target"])
+    y_test = test["target"]
+
+    # Обучение препроцессора
+    feature_preprocessor = FeaturePreprocessor()
+    feature_preprocessor.fit(X_train)
+
+    # Преобразование данных
+    data_preprocessor = DataPreprocessor()
+    train_fingerprint, test_fingerprint = fingerprints
+    if feature_cache_dir:
+        # Признаки переиспользуются, пока не изменились данные, препроцессор или COLUMNS
+        store = FeatureStore(feature_cache_dir)
+        X_train_processed = store.get_or_compute(
+            train_path, feature_preprocessor, data_preprocessor.columns,
+            lambda: data_preprocessor.data_preprocessing(X_train, feature_preprocessor),
+            fingerprint=train_fingerprint,
+        )
+        X_test_processed = store.get_or_compute(
+            test_path, feature_preprocessor, data_preprocessor.columns,
+            lambda: data_preprocessor.data_preprocessing(X_test, feature_preprocessor),
+            fingerprint=test_fingerprint,
+        )
+    else:
+        X_train_processed = data_preprocessor.data_preprocessing(X_train, feature_preprocessor)
+        X_test_processed = data_preprocessor.data_preprocessing(X_test, feature_preprocessor)
+
+    return feature_preprocessor, data_preprocessor, X_train_processed, y_train, X_test_processed, y_test
+
+
+def train_model(train_path, test_path, model_path, preprocessor_path, feature_cache_dir=None,
+                profile="gpu", pool_cache_dir=None, params_path=None, threshold=None, tune_threshold=False):
     # 1. Загрузка данных
-    train = pd.read_csv(train_path)
-    test = pd.read_csv(test_path)
+    train = read_dataset(train_path)
+    test = read_dataset(test_path)
 
     # 2. Создание папки Test Cases (если не существует)
     test_cases_dir = os.path.join(os.path.dirname(test_path), "..", "Test Cases")
@@ -36,52 +227,181 @@ def train_model(train_path, test_path, model_path, preprocessor_path):
 
         print(f"📦 Сохранён тест-кейс #{i} ➜ {parquet_path}, {json_path}")
 
+    # 4-5. Обучение препроцессора и преобразование данных
+    pool_cache_dir = pool_cache_dir or os.path.join("Data", "pool_cache")
+    train_fingerprint, test_fingerprint = data_fingerprints(
+        train_path, test_path, feature_cache_dir or (pool_cache_dir if profile == "cpu" else None)
+    )
+    feature_preprocessor, data_preprocessor, X_train_processed, y_train, X_test_processed, y_test = prepare_features(
+        train, test, train_path, test_path, feature_cache_dir, (train_fingerprint, test_fingerprint)
+    )
+
+    # 6. Обучение модели
+    overrides = {}
+    if params_path:
+        # Например, лучшие параметры из scripts.tune
+        with open(params_path, "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+    params = model_params(profile, **overrides)
+
+    if profile == "cpu":
+        # Квантованные пулы строятся один раз и переиспользуются между запусками
+        key = pool_cache_key(train_fingerprint, test_fingerprint, feature_preprocessor, data_preprocessor.columns)
+        train_pool_path, eval_pool_path = build_quantized_pools(
+            X_train_processed, y_train, X_test_processed, y_test, pool_cache_dir, key,
+            thread_count=params["thread_count"],
+        )
+        train_pool, eval_pool = load_quantized_pool(train_pool_path), load_quantized_pool(eval_pool_path)
+    else:
+        train_pool, eval_pool = Pool(X_train_processed, y_train), Pool(X_test_processed, y_test)
+
+    model = CatBoostClassifier(**params)
+
+    start = time.perf_counter()
+    model.fit(train_pool, eval_set=eval_pool, use_best_model=True)
+    elapsed = time.perf_counter() - start
+
+    n_iterations = trained_iterations(model)
+    print(
+        f"⏱️  Обучение ({profile}): {n_iterations} итераций за {elapsed:.1f} с "
+        f"({n_iterations / elapsed:.1f} it/s), лучшая итерация: {model.get_best_iteration()}"
+    )
+
+    # 7. Сохранение модели, порога решения и препроцессора
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    os.makedirs(os.path.dirname(preprocessor_path), exist_ok=True)
+
+    save_atomic(model_path, model.save_model)
+    threshold = decide_threshold(model, X_test_processed, y_test, threshold, tune_threshold)
+    save_threshold(model_path, threshold)
+    print(f"🎚️  Порог решения: {threshold:.2f}")
+    feature_preprocessor.save(preprocessor_path)
+    save_compact(feature_preprocessor, compact_path(preprocessor_path), source_path=preprocessor_path)
+    write_lineage(model_path, {
+        "mode": "full",
+        "threshold": threshold,
+        "profile": profile,
+        "parent_model_sha256": None,
+        "train_data": train_fingerprint,
+        "test_data": test_fingerprint,
+        "train_rows": len(train),
+        "tree_count": model.tree_count_,
+        "preprocessor_fingerprint": feature_preprocessor.fingerprint(),
+    }, history=[])
+
+    print("✅ Модель и препроцессор успешно сохранены.")
+
+
+def train_incremental(train_path, test_path, model_path, preprocessor_path, init_model_path,
+                      init_preprocessor_path, iterations=INCREMENTAL_ITERATIONS,
+                      shift_threshold=SHIFT_PSI_THRESHOLD, feature_cache_dir=None, threshold=None,
+                      tune_threshold=False):
+    """
+    Дообучение (warm start): к деревьям предыдущей модели добавляются новые, обученные
+    на свежих данных через init_model. Продолжение бустинга поддерживается только на CPU.
+
+    Квантильные таблицы препроцессора переобучаются только для колонок, у которых PSI
+    новых данных относительно сохранённых квантилей превышает shift_threshold;
+    без сдвига препроцессор остаётся прежним и признаки совпадают с признаками предка.
+
+    Компромисс: деревья предка обучены на прежнем кодировании ``<col>_qt`` и не переобучаются,
+    а после переобучения квантилей получают новое — их пороги для этих колонок смещаются.
+    Новые деревья дообучаются уже на новом кодировании и частично компенсируют сдвиг.
+    В lineage это фиксируется как ``quantile_refit_mode``: "none" или "shifted_columns"
+    (деревья предка видят переобученные квантили).
+    """
+    # 1. Загрузка данных, предыдущей модели и препроцессора
+    train = read_dataset(train_path)
+    test = read_dataset(test_path)
     X_train = train.drop(columns=["target"])
     y_train = train["target"]
     X_test = test.drop(columns=["target"])
     y_test = test["target"]
 
-    # 4. Обучение препроцессора
-    feature_preprocessor = FeaturePreprocessor()
-    feature_preprocessor.fit(X_train)
+    parent = CatBoostClassifier()
+    parent.load_model(init_model_path)
+    parent_sha256 = file_sha256(init_model_path)
+    history = load_lineage(init_model_path)
+    feature_preprocessor = FeaturePreprocessor.load(init_preprocessor_path)
 
-    # 5. Преобразование данных
-    data_preprocessor = DataPreprocessor()
-    X_train_processed = data_preprocessor.data_preprocessing(X_train, feature_preprocessor)
-    X_test_processed = data_preprocessor.data_preprocessing(X_test, feature_preprocessor)
+    # 2. Проверка сдвига распределений и точечное переобучение квантилей
+    psi = feature_preprocessor.quantile_shift(X_train)
+    shifted = sorted(col for col, value in psi.items() if value > shift_threshold)
+    if shifted:
+        feature_preprocessor.refit_quantiles(X_train, shifted)
+        print(f"📐 Сдвиг распределения (PSI > {shift_threshold}): {', '.join(shifted)} — квантили переобучены")
+    else:
+        print("📐 Сдвига распределений нет, препроцессор не меняется")
 
-    # 6. Обучение модели
-    model = CatBoostClassifier(
-        iterations=1000,
-        eval_metric="F1",
-        loss_function="Logloss",
-        random_seed=42,
-        early_stopping_rounds=30,
-        verbose=False,
-        allow_writing_files=False,
-        task_type="GPU",
-        learning_rate=0.151,
-        depth=14,
-        l2_leaf_reg=7.8457,
-        bagging_temperature=0.0443,
-        border_count=32,
-        random_strength=1.4266,
-    )
+    # 3. Преобразование данных
+    # Модели с квантованных пулов хранят имена признаков как "0", "1", ... — порядок берётся из COLUMNS
+    data_preprocessor = DataPreprocessor(model_columns(parent))
+    train_fingerprint, test_fingerprint = data_fingerprints(train_path, test_path, feature_cache_dir)
+    if feature_cache_dir:
+        store = FeatureStore(feature_cache_dir)
+        X_train_processed = store.get_or_compute(
+            train_path, feature_preprocessor, data_preprocessor.columns,
+            lambda: data_preprocessor.data_preprocessing(X_train, feature_preprocessor),
+            fingerprint=train_fingerprint,
+        )
+        X_test_processed = store.get_or_compute(
+            test_path, feature_preprocessor, data_preprocessor.columns,
+            lambda: data_preprocessor.data_preprocessing(X_test, feature_preprocessor),
+            fingerprint=test_fingerprint,
+        )
+    else:
+        X_train_processed = data_preprocessor.data_preprocessing(X_train, feature_preprocessor)
+        X_test_processed = data_preprocessor.data_preprocessing(X_test, feature_preprocessor)
 
+    # 4. Продолжение бустинга с тем же depth, что и у предка.
+    # Метки приводятся к типу классов предка (у моделей с квантованных пулов это float),
+    # иначе CatBoost не сможет сложить модели
+    y_train = y_train.astype(parent.classes_.dtype)
+    y_test = y_test.astype(parent.classes_.dtype)
+    params = model_params("cpu", iterations=iterations, depth=parent.get_all_params()["depth"])
+    model = CatBoostClassifier(**params)
+
+    start = time.perf_counter()
     model.fit(
-        Pool(X_train_processed, y_train),
-        eval_set=Pool(X_test_processed, y_test),
-        use_best_model=True,
+        Pool(X_train_processed, y_train), eval_set=Pool(X_test_processed, y_test),
+        init_model=parent, use_best_model=True,
+    )
+    elapsed = time.perf_counter() - start
+    print(
+        f"⏱️  Дообучение: +{model.tree_count_ - parent.tree_count_} деревьев "
+        f"(всего {model.tree_count_}) за {elapsed:.1f} с"
     )
 
-    # 7. Сохранение модели и препроцессора
+    # 5. Сохранение модели, препроцессора и истории
     os.makedirs(os.path.dirname(model_path), exist_ok=True)
     os.makedirs(os.path.dirname(preprocessor_path), exist_ok=True)
 
-    model.save_model(model_path)
+    save_atomic(model_path, model.save_model)
+    # Без явного порога и подбора дообученная модель наследует порог предка
+    threshold = decide_threshold(
+        model, X_test_processed, y_test, threshold, tune_threshold, default=load_threshold(init_model_path)
+    )
+    save_threshold(model_path, threshold)
+    print(f"🎚️  Порог решения: {threshold:.2f}")
     feature_preprocessor.save(preprocessor_path)
+    save_compact(feature_preprocessor, compact_path(preprocessor_path), source_path=preprocessor_path)
+    write_lineage(model_path, {
+        "mode": "incremental",
+        "threshold": threshold,
+        "profile": "cpu",
+        "parent_model_sha256": parent_sha256,
+        "train_data": train_fingerprint,
+        "test_data": test_fingerprint,
+        "train_rows": len(train),
+        "tree_count": model.tree_count_,
+        "trees_added": model.tree_count_ - parent.tree_count_,
+        "psi": psi,
+        "refit_quantile_columns": shifted,
+        "quantile_refit_mode": "shifted_columns" if shifted else "none",
+        "preprocessor_fingerprint": feature_preprocessor.fingerprint(),
+    }, history=history)
 
-    print("✅ Модель и препроцессор успешно сохранены.")
+    print("✅ Дообученная модель и препроцессор успешно сохранены.")
 
 
 if __name__ == "__main__":
@@ -92,14 +412,14 @@ if __name__ == "__main__":
     parser.add_argument(
         "--train_path",
         type=str,
-        default=os.path.join("Data", "processed", "train.csv"),
-        help="📂 Путь к обучающим данным CSV",
+        default=os.path.join("Data", "processed", "train.feather"),
+        help="📂 Путь к обучающим данным (feather, parquet, csv или .index.parquet)",
     )
     parser.add_argument(
         "--test_path",
         type=str,
-        default=os.path.join("Data", "processed", "test.csv"),
-        help="📂 Путь к тестовым данным CSV",
+        default=os.path.join("Data", "processed", "test.feather"),
+        help="📂 Путь к тестовым данным (feather, parquet, csv или .index.parquet)",
     )
     parser.add_argument(
         "--model_path",
@@ -114,11 +434,96 @@ if __name__ == "__main__":
         help="💾 Путь для сохранения препроцессора",
     )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        "--feature_cache_dir",
+        type=str,
+        default=None,
+        help="🗄️ Папка кэша признаков (по умолчанию кэш отключён)",
+    )
 
-    train_model(
-        args.train_path,
-        args.test_path,
-        args.model_path,
-        args.preprocessor_path,
+    parser.add_argument(
+        "--profile",
+        type=str,
+        choices=sorted(TRAINING_PROFILES),
+        default="gpu",
+        help="🖥️ Профиль обучения: gpu (depth=14) или cpu (depth=8, квантованные пулы, все доступные ядра)",
+    )
+    parser.add_argument(
+        "--pool_cache_dir",
+        type=str,
+        default=os.path.join("Data", "pool_cache"),
+        help="🗄️ Папка для квантованных пулов профиля cpu",
+    )
+
+    parser.add_argument(
+        "--params_path",
+        type=str,
+        default=None,
+        help="🎛️ JSON с гиперпараметрами, переопределяющими профиль (например, models/best_params.json)",
+    )
+
+    parser.add_argument(
+        "--init_model_path",
+        type=str,
+        default=None,
+        help="🔁 Дообучение: путь к предыдущей модели (.cbm); новые деревья обучаются поверх неё на CPU",
+    )
+    parser.add_argument(
+        "--init_preprocessor_path",
+        type=str,
+        default=None,
+        help="🔁 Препроцессор предыдущей модели (по умолчанию — --preprocessor_path)",
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=INCREMENTAL_ITERATIONS,
+        help="🌲 Сколько деревьев добавить при дообучении",
     )
+    parser.add_argument(
+        "--shift_threshold",
+        type=float,
+        default=SHIFT_PSI_THRESHOLD,
+        help="📐 Порог PSI, выше которого квантили колонки переобучаются",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=None,
+        help="🎚️ Порог решения, сохраняемый рядом с моделью (по умолчанию 0.5, при дообучении — порог предка)",
+    )
+    parser.add_argument(
+        "--tune_threshold",
+        action="store_true",
+        help="🎚️ Подобрать порог по лучшему F1 на тестовой выборке",
+    )
+
+    args = parser.parse_args()
+
+    if args.init_model_path:
+        train_incremental(
+            args.train_path,
+            args.test_path,
+            args.model_path,
+            args.preprocessor_path,
+            args.init_model_path,
+            args.init_preprocessor_path or args.preprocessor_path,
+            iterations=args.iterations,
+            shift_threshold=args.shift_threshold,
+            feature_cache_dir=args.feature_cache_dir,
+            threshold=args.threshold,
+            tune_threshold=args.tune_threshold,
+        )
+    else:
+        train_model(
+            args.train_path,
+            args.test_path,
+            args.model_path,
+            args.preprocessor_path,
+            feature_cache_dir=args.feature_cache_dir,
+            profile=args.profile,
+            pool_cache_dir=args.pool_cache_dir,
+            params_path=args.params_path,
+            threshold=args.threshold,
+            tune_threshold=args.tune_threshold,
+        )
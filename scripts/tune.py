@@ -0,0 +1,220 @@
+# scripts/tune.py
+
+import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import optuna
+from optuna.storages import JournalStorage
+from optuna.storages.journal import JournalFileBackend
+from catboost import CatBoostClassifier
+
+from scripts.dataset_io import read_dataset
+from scripts.train import (
+    available_cpus,
+    build_quantized_pools,
+    data_fingerprints,
+    load_quantized_pool,
+    model_params,
+    pool_cache_key,
+    prepare_features,
+)
+
+
+class PruningCallback:
+    """
+    Колбэк CatBoost: каждые ``report_every`` итераций отправляет значение eval-метрики
+    в optuna и останавливает обучение, если прунер решил отсечь trial.
+    """
+
+    def __init__(self, trial: optuna.Trial, metric: str, report_every: int = 10):
+        self.trial = trial
+        self.metric = metric
+        self.report_every = report_every
+        self.pruned = False
+
+    def after_iteration(self, info) -> bool:
+        if info.iteration % self.report_every:
+            return True
+        value = info.metrics["validation"][self.metric][-1]
+        self.trial.report(value, step=info.iteration)
+        if self.trial.should_prune():
+            self.pruned = True
+            return False
+        return True
+
+
+def suggest_params(trial: optuna.Trial) -> dict:
+    """Пространство поиска (как в Notebooks/Model Selection.ipynb, глубина — под CPU)."""
+    return {
+        "learning_rate": trial.suggest_float("learning_rate", 0.01, 0.5, log=True),
+        "depth": trial.suggest_int("depth", 4, 10),
+        "l2_leaf_reg": trial.suggest_float("l2_leaf_reg", 1, 8),
+        "bagging_temperature": trial.suggest_float("bagging_temperature", 0, 1),
+        "random_strength": trial.suggest_float("random_strength", 0.1, 2),
+    }
+
+
+# === Состояние процесса-воркера: пулы загружаются один раз и переиспользуются всеми его trial'ами ===
+_worker = {}
+
+
+def _init_worker(train_pool_path: str, eval_pool_path: str):
+    _worker["train_pool"] = load_quantized_pool(train_pool_path)
+    _worker["eval_pool"] = load_quantized_pool(eval_pool_path)
+
+
+def _run_worker(study_name: str, storage_path: str, n_trials: int, metric: str, thread_count: int,
+                report_every: int):
+    storage = JournalStorage(JournalFileBackend(storage_path))
+    study = optuna.load_study(study_name=study_name, storage=storage)
+
+    def objective(trial: optuna.Trial) -> float:
+        params = model_params("cpu", eval_metric=metric, thread_count=thread_count, **suggest_params(trial))
+        callback = PruningCallback(trial, metric, report_every)
+
+        model = CatBoostClassifier(**params)
+        model.fit(_worker["train_pool"], eval_set=_worker["eval_pool"], use_best_model=True, callbacks=[callback])
+
+        if callback.pruned:
+            raise optuna.TrialPruned()
+        trial.set_user_attr("best_iteration", model.get_best_iteration())
+        return model.get_best_score()["validation"][metric]
+
+    study.optimize(objective, n_trials=n_trials)
+
+
+def tune(train_path, test_path, storage_path, study_name, n_trials, n_jobs, metric="F1",
+         pool_cache_dir=None, feature_cache_dir=None, best_params_path=None, report_every=10):
+    """
+    Поиск гиперпараметров CatBoost на CPU.
+
+    Квантованные пулы строятся один раз (см. scripts.train) и загружаются каждым процессом-воркером.
+    ``n_jobs`` процессов выполняют trial'ы параллельно, каждый с ``cpus // n_jobs`` потоками.
+    История хранится в журнале optuna (``storage_path``): повторный запуск с тем же
+    ``study_name`` продолжает поиск.
+    """
+    # 1. Признаки и квантованные пулы
+    train, test = read_dataset(train_path), read_dataset(test_path)
+    pool_cache_dir = pool_cache_dir or os.path.join("Data", "pool_cache")
+    fingerprints = data_fingerprints(train_path, test_path, feature_cache_dir or pool_cache_dir)
+    feature_preprocessor, data_preprocessor, X_train, y_train, X_test, y_test = prepare_features(
+        train, test, train_path, test_path, feature_cache_dir, fingerprints
+    )
+    key = pool_cache_key(*fingerprints, feature_preprocessor, data_preprocessor.columns)
+    train_pool_path, eval_pool_path = build_quantized_pools(
+        X_train, y_train, X_test, y_test, pool_cache_dir, key
+    )
+    del train, test, X_train, X_test
+
+    # 2. Study с журналом на диске (продолжается, если уже существует)
+    os.makedirs(os.path.dirname(storage_path) or ".", exist_ok=True)
+    storage = JournalStorage(JournalFileBackend(storage_path))
+    study = optuna.create_study(
+        study_name=study_name,
+        storage=storage,
+        direction="maximize",
+        pruner=optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=50),
+        load_if_exists=True,
+    )
+    done = len([t for t in study.trials if t.state.is_finished()])
+    print(f"🔎 Study '{study_name}': завершено trial'ов — {done}, осталось — {max(n_trials - done, 0)}")
+
+    # 3. Параллельный запуск trial'ов
+    remaining = max(n_trials - done, 0)
+    n_jobs = max(1, min(n_jobs, remaining or 1))
+    thread_count = max(1, available_cpus() // n_jobs)
+    per_worker = [remaining // n_jobs + (i < remaining % n_jobs) for i in range(n_jobs)]
+
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                             initargs=(train_pool_path, eval_pool_path)) as executor:
+        futures = [
+            executor.submit(_run_worker, study_name, storage_path, n, metric, thread_count, report_every)
+            for n in per_worker if n > 0
+        ]
+        for future in futures:
+            future.result()
+
+    # 4. Итоги
+    study = optuna.load_study(study_name=study_name, storage=storage)
+    pruned = len([t for t in study.trials if t.state == optuna.trial.TrialState.PRUNED])
+    print(f"🏆 Лучший {metric}: {study.best_value:.5f} (trial #{study.best_trial.number}), отсечено: {pruned}")
+    print(f"🎛️ Параметры: {study.best_params}")
+
+    if best_params_path:
+        os.makedirs(os.path.dirname(best_params_path) or ".", exist_ok=True)
+        with open(best_params_path, "w", encoding="utf-8") as f:
+            json.dump(study.best_params, f, indent=4)
+        print(f"💾 Лучшие параметры сохранены в {best_params_path}")
+
+    return study
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="🔎 Parallel CatBoost hyperparameter search (CPU, resumable)"
+    )
+
+    parser.add_argument(
+        "--train_path",
+        type=str,
+        default=os.path.join("Data", "processed", "train.feather"),
+        help="📂 Путь к обучающим данным",
+    )
+    parser.add_argument(
+        "--test_path",
+        type=str,
+        default=os.path.join("Data", "processed", "test.feather"),
+        help="📂 Путь к валидационным данным",
+    )
+    parser.add_argument(
+        "--storage_path",
+        type=str,
+        default=os.path.join("models", "tuning", "study.journal"),
+        help="💾 Журнал optuna с историей trial'ов (для продолжения поиска)",
+    )
+    parser.add_argument("--study_name", type=str, default="catboost_cpu", help="🏷️ Имя study")
+    parser.add_argument("--n_trials", type=int, default=100, help="🔢 Общее число trial'ов в study")
+    parser.add_argument("--n_jobs", type=int, default=4, help="🧵 Число параллельных trial'ов")
+    parser.add_argument("--metric", type=str, default="F1", help="📏 Eval-метрика CatBoost для отбора и пруннинга")
+    parser.add_argument(
+        "--report_every",
+        type=int,
+        default=10,
+        help="⏱️ Как часто (в итерациях) сообщать метрику прунеру",
+    )
+    parser.add_argument(
+        "--pool_cache_dir",
+        type=str,
+        default=os.path.join("Data", "pool_cache"),
+        help="🗄️ Папка для квантованных пулов",
+    )
+    parser.add_argument(
+        "--feature_cache_dir",
+        type=str,
+        default=None,
+        help="🗄️ Папка кэша признаков",
+    )
+    parser.add_argument(
+        "--best_params_path",
+        type=str,
+        default=os.path.join("models", "best_params.json"),
+        help="💾 Куда сохранить лучшие параметры (для train.py --params_path)",
+    )
+
+    args = parser.parse_args()
+
+    tune(
+        args.train_path,
+        args.test_path,
+        args.storage_path,
+        args.study_name,
+        args.n_trials,
+        args.n_jobs,
+        metric=args.metric,
+        pool_cache_dir=args.pool_cache_dir,
+        feature_cache_dir=args.feature_cache_dir,
+        best_params_path=args.best_params_path,
+        report_every=args.report_every,
+    )